@@ -0,0 +1,72 @@
+import calendar
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Returns a weak ETag made from a hash of `parts`.
+
+    ETags are weak because the parts describe the resource, not the
+    exact bytes of the response (e.g. JSON and the browsable API share
+    an ETag)."""
+
+    digest = hashlib.md5(repr(parts).encode("utf-8"), usedforsecurity=False)
+    return 'W/"' + digest.hexdigest() + '"'
+
+
+def conditional(get_validators):
+    """Decorator that answers conditional GET requests for a view.
+
+    `get_validators` is called with the same arguments as the view, and
+    returns an `(etag, last_modified)` pair for the requested resource,
+    where either value can be None. It should cost a single cheap query
+    at most; if the client's copy is still current, a 304 is returned
+    without running the view.
+
+    When the resource can't be found, `get_validators` returns None and
+    the view runs as normal (and returns its own 404).
+
+    Works on function views and, through `method_decorator`, on ViewSet
+    methods. Either way, this needs to go under `api_view` so that the
+    request has been through DRF first.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            validators = get_validators(request, *args, **kwargs)
+            if validators is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators
+            timestamp = None
+            if last_modified is not None:
+                timestamp = calendar.timegm(last_modified.utctimetuple())
+
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=timestamp,
+            )
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+
+            if response.status_code == 200:
+                if etag is not None:
+                    response.headers.setdefault("ETag", etag)
+                if timestamp is not None:
+                    response.headers.setdefault("Last-Modified", http_date(timestamp))
+
+            return response
+
+        return wrapped_view
+
+    return decorator
@@ -0,0 +1,261 @@
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {
+    "taskboard_requests_total": (
+        "counter", "Requests handled, by route, method and status code.", None,
+    ),
+    "taskboard_request_errors_total": (
+        "counter", "Requests that failed with a 5xx status code.", None,
+    ),
+    "taskboard_request_duration_seconds": (
+        "histogram", "Time taken to handle a request.", DURATION_BUCKETS,
+    ),
+    "taskboard_request_queries": (
+        "histogram", "SQL statements run while handling a request.", QUERY_BUCKETS,
+    ),
+    "taskboard_response_size_bytes": (
+        "histogram", "Size of response bodies. Streamed responses aren't counted.",
+        SIZE_BUCKETS,
+    ),
+}
+"""Every metric, as (type, help, histogram buckets)."""
+
+
+class MetricsRegistry:
+    """Counters and histograms, kept in memory and added to a SQLite
+    file every so often, so that every worker's metrics end up in one
+    place.
+
+    Values in the file only ever go up, across restarts too, which is
+    what Prometheus expects of counters and histograms.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+
+        self.flush_interval = flush_interval
+        """Seconds between writes to the file. Metrics read from the
+        file can be this far behind the other workers."""
+
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._flushed_at = time.monotonic()
+        self._local = threading.local()
+
+    def increment(self, name, labels, amount=1):
+        key = (name, json.dumps(labels, sort_keys=True), "")
+        with self._lock:
+            self._values[key] += amount
+
+    def observe(self, name, labels, value):
+        """Adds a value to a histogram. Buckets are stored by their own
+        count, and made cumulative when rendered."""
+
+        buckets = METRICS[name][2]
+        index = bisect.bisect_left(buckets, value)
+        le = str(buckets[index]) if index < len(buckets) else "+Inf"
+        labels = json.dumps(labels, sort_keys=True)
+
+        with self._lock:
+            self._values[(name + "_bucket", labels, le)] += 1
+            self._values[(name + "_sum", labels, "")] += value
+            self._values[(name + "_count", labels, "")] += 1
+
+    def get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS metrics ("
+                "name TEXT NOT NULL, labels TEXT NOT NULL, le TEXT NOT NULL, "
+                "value REAL NOT NULL, PRIMARY KEY (name, labels, le))"
+            )
+            self._local.connection = connection
+        return connection
+
+    def flush(self, force=False):
+        """Adds the values gathered since the last flush to the file, if
+        `flush_interval` has passed."""
+
+        with self._lock:
+            if not force and time.monotonic() - self._flushed_at < self.flush_interval:
+                return
+            values = self._values
+            self._values = defaultdict(float)
+            self._flushed_at = time.monotonic()
+
+        if not values:
+            return
+
+        connection = self.get_connection()
+        try:
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value",
+                    [key + (value,) for key, value in values.items()],
+                )
+        except sqlite3.Error:
+            # keep the values for the next flush, rather than lose them
+            with self._lock:
+                for key, value in values.items():
+                    self._values[key] += value
+            raise
+
+    def render(self):
+        """Returns every metric in the Prometheus text format."""
+
+        self.flush(force=True)
+        rows = self.get_connection().execute(
+            "SELECT name, labels, le, value FROM metrics ORDER BY name, labels"
+        ).fetchall()
+
+        series = defaultdict(list)
+        for name, labels, le, value in rows:
+            series[name].append((json.loads(labels), le, value))
+
+        lines = []
+        for metric, (type, help, bounds) in METRICS.items():
+            lines.append("# HELP " + metric + " " + help)
+            lines.append("# TYPE " + metric + " " + type)
+
+            if type == "counter":
+                for labels, le, value in series[metric]:
+                    lines.append(metric + format_labels(labels) + " " + format_value(value))
+                continue
+
+            # buckets are cumulative, and end with +Inf
+            buckets = defaultdict(dict)
+            for labels, le, value in series[metric + "_bucket"]:
+                buckets[json.dumps(labels, sort_keys=True)][le] = value
+
+            for labels, le, count in series[metric + "_count"]:
+                counts = buckets[json.dumps(labels, sort_keys=True)]
+                total = 0
+                for bound in bounds + ("+Inf",):
+                    total += counts.get(str(bound), 0)
+                    lines.append(
+                        metric + "_bucket" + format_labels(dict(labels, le=str(bound))) + \
+                        " " + format_value(total)
+                    )
+                lines.append(metric + "_count" + format_labels(labels) + " " + format_value(count))
+
+            for labels, le, value in series[metric + "_sum"]:
+                lines.append(metric + "_sum" + format_labels(labels) + " " + format_value(value))
+
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return "{" + ",".join(
+        name + '="' + escape(value) + '"' for name, value in sorted(labels.items())
+    ) + "}"
+
+
+def format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the process wide MetricsRegistry, writing to the file at
+    `TASKBOARD_METRICS_PATH`."""
+
+    global _registry
+
+    with _registry_lock:
+        if _registry is None or _registry.path != settings.TASKBOARD_METRICS_PATH:
+            _registry = MetricsRegistry(settings.TASKBOARD_METRICS_PATH)
+
+    return _registry
+
+
+def get_route(request):
+    """Returns the name of the route a request matched, like tasks-list
+    or activity."""
+
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.url_name or match.view_name or "unnamed"
+
+
+class MetricsMiddleware:
+    """Records the count, duration, query count and response size of
+    every request in the metrics registry. Turned on with the
+    `TASKBOARD_METRICS` setting."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TASKBOARD_METRICS:
+            return self.get_response(request)
+
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        registry = get_registry()
+        route = get_route(request)
+        labels = {"route": route, "method": request.method}
+
+        registry.increment(
+            "taskboard_requests_total",
+            dict(labels, status=str(response.status_code)),
+        )
+        if response.status_code >= 500:
+            registry.increment("taskboard_request_errors_total", labels)
+
+        registry.observe("taskboard_request_duration_seconds", labels, duration)
+        registry.observe("taskboard_request_queries", labels, queries[0])
+        if not response.streaming:
+            registry.observe("taskboard_response_size_bytes", labels, len(response.content))
+
+        try:
+            registry.flush()
+        except sqlite3.Error:
+            # metrics are never worth failing a request over. the values
+            # are kept for the next flush
+            pass
+
+        return response
+
@@ -0,0 +1,152 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+NAME_PATTERN = re.compile(r"[0-9]{8}T[0-9]{6}-[0-9a-f]{8}(\.prof|\.txt|-memory\.txt)")
+"""Names of the files written by ProfilingMiddleware. Anything else
+can't be downloaded."""
+
+REPORT_LINES = 60
+"""Number of functions, or of allocating lines, in the text reports."""
+
+TRACEMALLOC_FRAMES = 10
+
+_lock = threading.Lock()
+
+
+def get_profile_path(name):
+    """Returns the path of a profile file, or None if the name isn't
+    one that ProfilingMiddleware writes."""
+
+    if not NAME_PATTERN.fullmatch(name):
+        return None
+    return os.path.join(settings.TASKBOARD_PROFILE_DIR, name)
+
+
+def is_staff(request):
+    """Returns whether a request comes from a staff user, through either
+    a JWT or the admin's session."""
+
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+
+    # DRF only authenticates the request once it reaches a view, so the
+    # token has to be checked here
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+
+    return authenticated is not None and authenticated[0].is_staff
+
+
+class ProfilingMiddleware:
+    """Profiles a request with cProfile when a staff user asks for it,
+    with `?profile` or an `X-Profile` header. Asking for
+    `?profile=memory` (or `X-Profile: memory`) also records the
+    allocations made by the request with tracemalloc.
+
+    The reports are written to `TASKBOARD_PROFILE_DIR`, and linked from
+    the `X-Profile` and `X-Profile-Memory` response headers. The `.prof`
+    file is for tools such as snakeviz or `python -m pstats`, and a
+    plain text summary is written next to it.
+
+    Only one request is profiled at a time. If another is already being
+    profiled, the request runs as normal and `X-Profile` says "busy".
+
+    Note that `?profile` changes the query string, so it never gets a
+    cached response, whereas the header does.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get("profile", request.headers.get("X-Profile"))
+        if mode is None or not settings.TASKBOARD_PROFILING or not is_staff(request):
+            return self.get_response(request)
+
+        if not _lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response["X-Profile"] = "busy"
+            return response
+
+        try:
+            return self.profile(request, mode == "memory")
+        finally:
+            _lock.release()
+
+    def profile(self, request, memory):
+        # tracemalloc may already be on, e.g. under bench_api, in which
+        # case it's left on afterwards
+        trace_memory = memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+        profiler = cProfile.Profile()
+        try:
+            if memory:
+                tracemalloc.clear_traces()
+                tracemalloc.reset_peak()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                size, peak = tracemalloc.get_traced_memory()
+            else:
+                snapshot = None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+        os.makedirs(settings.TASKBOARD_PROFILE_DIR, exist_ok=True)
+        name = timezone.now().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        title = request.method + " " + request.get_full_path()
+
+        profiler.dump_stats(get_profile_path(name + ".prof"))
+
+        report = io.StringIO()
+        report.write(title + "\n\n")
+        pstats.Stats(profiler, stream=report) \
+            .sort_stats(pstats.SortKey.CUMULATIVE) \
+            .print_stats(REPORT_LINES)
+        self.write(name + ".txt", report.getvalue())
+
+        response["X-Profile"] = self.get_link(request, name + ".prof")
+
+        if snapshot is not None:
+            statistics = snapshot.statistics("lineno")
+            lines = [title, "", "Top allocations by line:", ""]
+            for statistic in statistics[:REPORT_LINES]:
+                lines.append(str(statistic))
+            lines.append("")
+            lines.append("Still allocated: " + format(size / 1024, ".1f") + " KiB")
+            lines.append("Peak: " + format(peak / 1024, ".1f") + " KiB")
+            self.write(name + "-memory.txt", "\n".join(lines) + "\n")
+
+            response["X-Profile-Memory"] = self.get_link(request, name + "-memory.txt")
+
+        return response
+
+    def write(self, name, content):
+        with open(get_profile_path(name), "w") as file:
+            file.write(content)
+
+    def get_link(self, request, name):
+        return request.build_absolute_uri(reverse("debug-profile", args=[name]))
@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "users.TaskboardUser"  # new
 
 MIDDLEWARE = [
+    'taskboard.metrics.MetricsMiddleware',
+    'taskboard.timing.ServerTimingMiddleware',
+    'taskboard.slowqueries.SlowQueryMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -52,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'taskboard.profiling.ProfilingMiddleware',
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -62,6 +66,36 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_ALL_ORIGINS = True  # i don't know why the origins aren't working
 
+CORS_EXPOSE_HEADERS = ["Server-Timing", "X-DB-Queries", "X-Profile", "X-Profile-Memory"]
+
+# adds Server-Timing and X-DB-Queries headers to every response, with
+# the query count and the time spent on SQL, serializers, rendering and
+# the whole request. on by default when DEBUG is
+TASKBOARD_SERVER_TIMING = os.getenv("SERVER_TIMING", str(DEBUG)) == "True"
+
+# SQL statements taking longer than this many milliseconds are logged,
+# with the view that ran them and their query plan. see them at
+# /api/debug/slow-queries/ (staff only) or with `manage.py
+# dump_slow_queries`. the log keeps the last SLOW_QUERY_LOG_SIZE entries
+# in the cache. 0 turns it off
+TASKBOARD_SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+TASKBOARD_SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+# staff users can profile a request by adding ?profile (or ?profile=memory
+# to also trace allocations). the reports are written to PROFILE_DIR and
+# linked from the X-Profile response header. on by default when DEBUG is
+TASKBOARD_PROFILING = os.getenv("PROFILING", str(DEBUG)) == "True"
+TASKBOARD_PROFILE_DIR = os.getenv("PROFILE_DIR", "/var/tmp/taskboard_profiles")
+
+# request counts, latencies, query counts and response sizes per route,
+# served at /metrics for Prometheus. every worker adds its metrics to
+# the SQLite file at METRICS_PATH. when METRICS_TOKEN is set, scrapes
+# need an "Authorization: Bearer <token>" header. off unless METRICS is
+# set to True. while it's off, /metrics returns a 404
+TASKBOARD_METRICS = os.getenv("METRICS", "False") == "True"
+TASKBOARD_METRICS_PATH = os.getenv("METRICS_PATH", "/var/tmp/taskboard_metrics.sqlite3")
+TASKBOARD_METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
 ROOT_URLCONF = 'taskboard.urls'
 
 TEMPLATES = [
@@ -89,6 +123,51 @@ DATABASES = {
     }
 }
 
+# the local memory cache is per process. when running more than one
+# worker, use the file or database backend instead so that cache
+# invalidation reaches every worker. the database backend needs
+# `python manage.py createcachetable` to be run first
+match os.getenv("CACHE_BACKEND", "locmem"):
+    case "file":
+        CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": os.getenv("CACHE_LOCATION", "/var/tmp/taskboard_cache"),
+            }
+        }
+    case "db":
+        CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": os.getenv("CACHE_LOCATION", "taskboard_cache"),
+            }
+        }
+    case _:
+        CACHES = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "OPTIONS": {"MAX_ENTRIES": 10000},
+            }
+        }
+
+# upper bound on how long a cached response lives, in seconds. cached
+# responses are dropped as soon as their data changes, so this only
+# matters for changes the signals can't see. 0 turns the cache off
+TASKBOARD_RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+
+# concurrent identical requests to the heavier read endpoints share one
+# run of the view. "process" coalesces requests within a worker, "shared"
+# also coalesces between workers through a lock in the cache (so it
+# needs the file or db cache backend), and "off" turns it off
+TASKBOARD_SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "process")
+
+# notifying watchers of new comments and recording activity is done
+# during the request by default. with OUTBOX_SYNC set to False, it's
+# queued in an outbox table instead, and done in the background by
+# `manage.py run_taskboard_worker`. the worker then has to be running, or
+# no notifications or activity are ever added
+TASKBOARD_OUTBOX_SYNC = os.getenv("OUTBOX_SYNC", "True") == "True"
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -121,6 +200,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': (
+        'taskboard.timing.TimedJSONRenderer',
+        'taskboard.timing.TimedBrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     )
@@ -0,0 +1,188 @@
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, NotSupportedError, connections
+from django.utils import timezone
+
+
+COUNTER_KEY = "taskboard:slowqueries:counter"
+ENTRY_KEY = "taskboard:slowqueries:entry:{slot}"
+
+_view = ContextVar("taskboard_slow_query_view", default=None)
+_recording = ContextVar("taskboard_slow_query_recording", default=False)
+
+
+def get_view_name(view_func, method):
+    """Returns a readable name for a view, like `TaskViewSet.list` for
+    ViewSet actions and `view_user_activity` for function views."""
+
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return view_func.__module__ + "." + view_func.__name__
+
+    # api_view names the class it creates after the function
+    name = view_class.__name__
+
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        name += "." + actions.get(method.lower(), method.lower())
+
+    return name
+
+
+def explain(connection, sql, params):
+    """Returns the query plan of a statement as a list of lines, or None
+    when the database can't explain it."""
+
+    try:
+        prefix = connection.ops.explain_query_prefix()
+    except NotSupportedError:
+        return None
+
+    # a cursor straight from the backend skips the execute wrappers, so
+    # the EXPLAIN isn't timed or logged itself
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + " " + sql, params)
+        rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        cursor.close()
+
+    if connection.vendor != "sqlite":
+        return [" ".join(str(column) for column in row) for row in rows]
+
+    # sqlite returns (id, parent, notused, detail) rows, making a tree
+    depths = {0: -1}
+    plan = []
+    for id, parent, notused, detail in rows:
+        depths[id] = depths.get(parent, -1) + 1
+        plan.append("  " * depths[id] + detail)
+
+    return plan
+
+
+def to_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def record(entry):
+    """Adds an entry to the slow query log.
+
+    The log is a ring buffer kept in the cache, holding the last
+    `TASKBOARD_SLOW_QUERY_LOG_SIZE` entries. With the file or database
+    cache backend, it's shared by every worker and management command;
+    with the local memory backend, each process has its own."""
+
+    try:
+        number = cache.incr(COUNTER_KEY)
+    except ValueError:
+        cache.add(COUNTER_KEY, 0, timeout=None)
+        number = cache.incr(COUNTER_KEY)
+
+    slot = number % settings.TASKBOARD_SLOW_QUERY_LOG_SIZE
+    cache.set(ENTRY_KEY.format(slot=slot), dict(entry, number=number), timeout=None)
+
+
+def get_entries():
+    """Returns the entries of the slow query log, newest first."""
+
+    keys = [
+        ENTRY_KEY.format(slot=slot)
+        for slot in range(settings.TASKBOARD_SLOW_QUERY_LOG_SIZE)
+    ]
+    entries = list(cache.get_many(keys).values())
+    entries.sort(key=lambda entry: entry["number"], reverse=True)
+
+    return entries
+
+
+def clear():
+    """Empties the slow query log."""
+
+    cache.delete_many([
+        ENTRY_KEY.format(slot=slot)
+        for slot in range(settings.TASKBOARD_SLOW_QUERY_LOG_SIZE)
+    ])
+
+
+class SlowQueryRecorder:
+    """Database execute wrapper logging statements slower than
+    `TASKBOARD_SLOW_QUERY_MS`, along with their query plan."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - start) * 1000
+
+        threshold = settings.TASKBOARD_SLOW_QUERY_MS
+        if duration < threshold or _recording.get():
+            return result
+
+        # recording can run queries of its own (e.g. with the database
+        # cache backend), which mustn't be recorded in turn
+        token = _recording.set(True)
+        try:
+            self.record(sql, params, many, duration)
+        finally:
+            _recording.reset(token)
+
+        return result
+
+    def record(self, sql, params, many, duration):
+        plan = None
+        if not many:
+            plan = explain(self.connection, sql, params)
+            if isinstance(params, dict):
+                params = {name: to_json(value) for name, value in params.items()}
+            else:
+                params = [to_json(value) for value in params or ()]
+        else:
+            params = None
+
+        record({
+            "datetime": timezone.now().isoformat(),
+            "view": _view.get(),
+            "database": self.connection.alias,
+            "duration_ms": round(duration, 3),
+            "sql": sql,
+            "params": params,
+            "plan": plan,
+        })
+
+
+class SlowQueryMiddleware:
+    """Records slow SQL statements run while handling a request, see
+    `SlowQueryRecorder`. Turned off by setting `TASKBOARD_SLOW_QUERY_MS`
+    to 0."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TASKBOARD_SLOW_QUERY_MS:
+            return self.get_response(request)
+
+        token = _view.set(None)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(SlowQueryRecorder(connection))
+                    )
+                return self.get_response(request)
+        finally:
+            _view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.TASKBOARD_SLOW_QUERY_MS:
+            _view.set(get_view_name(view_func, request.method))
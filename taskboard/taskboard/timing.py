@@ -0,0 +1,153 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+
+_timings = ContextVar("taskboard_timings", default=None)
+
+
+class RequestTimings:
+    """Where the time of a request went, in milliseconds."""
+
+    def __init__(self):
+        self.queries = 0
+
+        self.db = 0.0
+        """Time spent running SQL."""
+
+        self.serialize = 0.0
+        """Time spent in serializers, not counting SQL they ran (e.g.
+        from a relation that wasn't prefetched)."""
+
+        self.render = 0.0
+        """Time spent turning serialized data into the response body."""
+
+        self._depth = 0
+
+
+def get_timings():
+    """Returns the timings of the current request, or None when the
+    request isn't being timed."""
+
+    return _timings.get()
+
+
+@contextmanager
+def measure(name):
+    """Adds the time spent in the block to the `name` attribute of the
+    current request's timings. SQL run inside the block is left out,
+    since it's already counted under `db`.
+
+    Blocks can nest (e.g. a serializer serializing its relations), in
+    which case only the outermost one counts."""
+
+    timings = get_timings()
+    if timings is None or timings._depth:
+        yield
+        return
+
+    timings._depth += 1
+    db_start = timings.db
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000 - (timings.db - db_start)
+        setattr(timings, name, getattr(timings, name) + elapsed)
+        timings._depth -= 1
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries and their time."""
+
+    timings = get_timings()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.queries += 1
+            timings.db += (time.perf_counter() - start) * 1000
+
+
+class TimedSerializerMixin:
+    """Mixin for serializers, timing the serializer under `serialize`
+    when its data is read.
+
+    Serializers used with `many=True` also need `TimedListSerializer`
+    as the `list_serializer_class` of their Meta."""
+
+    @property
+    def data(self):
+        with measure("serialize"):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class TimedRendererMixin:
+    """Mixin for renderers, timing them under `render`."""
+
+    def render(self, *args, **kwargs):
+        with measure("render"):
+            return super().render(*args, **kwargs)
+
+
+class TimedJSONRenderer(TimedRendererMixin, JSONRenderer):
+    pass
+
+
+class TimedBrowsableAPIRenderer(TimedRendererMixin, BrowsableAPIRenderer):
+    pass
+
+
+class ServerTimingMiddleware:
+    """Times every request, and reports it in the `Server-Timing` and
+    `X-DB-Queries` response headers.
+
+    The `db`, `serialize` and `render` entries don't overlap, and the
+    `view` entry is the total time spent handling the request. Turned
+    on with the `TASKBOARD_SERVER_TIMING` setting.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TASKBOARD_SERVER_TIMING:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+
+        view = (time.perf_counter() - start) * 1000
+
+        response["Server-Timing"] = \
+            'db;dur=' + format(timings.db, ".2f") + \
+            ';desc="' + str(timings.queries) + ' queries", ' + \
+            "serialize;dur=" + format(timings.serialize, ".2f") + ", " + \
+            "render;dur=" + format(timings.render, ".2f") + ", " + \
+            "view;dur=" + format(view, ".2f")
+        response["X-DB-Queries"] = str(timings.queries)
+
+        # lets the frontend read the timings through the Resource Timing
+        # API, as it's served from another origin
+        response["Timing-Allow-Origin"] = "*"
+
+        return response
@@ -25,6 +25,7 @@ from users.views import (
     view_profile,
     ProfileViewSet,
 )
+from taskboard.views import view_slow_queries, download_profile, view_metrics
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -40,14 +41,20 @@ router.register(r"profiles", ProfileViewSet, basename="profiles")
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("api/tasks/types/", views.get_task_types),
-    path("api/tasks/status/", views.get_task_status_types),
+    path("api/tasks/types/", views.get_task_types, name="task-types"),
+    path("api/tasks/status/", views.get_task_status_types, name="task-status-types"),
     path('api/', include(router.urls)),
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('api/token/status/', LoginStatusAPI.as_view()),
-    path("api/register/", RegisterAPI.as_view()),
-    path("api/user/<username>/notifications/", views.view_notifications),
-    path("api/user/<username>/profile/", view_profile),
-    path("api/user/<username>/activity/", views.view_user_activity),
+    path('api/token/status/', LoginStatusAPI.as_view(), name='token_status'),
+    path("api/register/", RegisterAPI.as_view(), name="register"),
+    path("api/user/<username>/notifications/", views.view_notifications, name="notifications"),
+    path("api/user/<username>/notifications/unread-count/", views.view_unread_count, name="notifications-unread-count"),
+    path("api/user/<username>/notifications/mark-read/", views.mark_notifications_read, name="notifications-mark-read"),
+    path("api/user/<username>/profile/", view_profile, name="profile"),
+    path("api/user/<username>/activity/", views.view_user_activity, name="activity"),
+    path("api/export/", views.export_tasks, name="export"),
+    path("api/debug/slow-queries/", view_slow_queries, name="debug-slow-queries"),
+    path("api/debug/profiles/<name>", download_profile, name="debug-profile"),
+    path("metrics", view_metrics, name="metrics"),
 ]
@@ -0,0 +1,64 @@
+import hmac
+import os
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import slowqueries
+from .metrics import get_registry
+from .profiling import get_profile_path
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def view_slow_queries(request):
+    """Returns the slow query log, newest first. A DELETE empties it.
+
+    Staff only, since the log holds raw SQL and its parameters."""
+
+    if request.method == "DELETE":
+        slowqueries.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response({
+        "threshold_ms": settings.TASKBOARD_SLOW_QUERY_MS,
+        "results": slowqueries.get_entries(),
+    })
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def download_profile(request, name):
+    """Returns a report written by ProfilingMiddleware. Staff only."""
+
+    path = get_profile_path(name)
+    if path is None or not os.path.isfile(path):
+        raise Http404
+
+    return FileResponse(open(path, "rb"), as_attachment=name.endswith(".prof"))
+
+
+def view_metrics(request):
+    """Returns the metrics of every worker, for Prometheus to scrape.
+    Returns a 404 when `TASKBOARD_METRICS` is off.
+
+    When `TASKBOARD_METRICS_TOKEN` is set, the request needs an
+    `Authorization: Bearer <token>` header with it."""
+
+    if not settings.TASKBOARD_METRICS:
+        raise Http404
+
+    token = settings.TASKBOARD_METRICS_TOKEN
+    if token:
+        given = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode("utf-8"), ("Bearer " + token).encode("utf-8")):
+            return HttpResponseForbidden()
+
+    return HttpResponse(
+        get_registry().render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -16,7 +16,12 @@ class CommentInline(admin.TabularInline):
 
 class TaskAdmin(admin.ModelAdmin):
     inlines = [CommentInline,] # do not use a string here, it will break
-    pass
+
+    def save_model(self, request, obj, form, change):
+        # so a status change is put down to the staff member, not the
+        # task's author
+        obj.changed_by = request.user
+        super().save_model(request, obj, form, change)
 
 
 class NotificationAdmin(admin.ModelAdmin):
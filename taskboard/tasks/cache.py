@@ -0,0 +1,131 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+from .streaming import wants_stream
+
+
+VERSION_KEY = "taskboard:version:{namespace}"
+RESPONSE_KEY = "taskboard:response:{namespace}:{version}:{digest}"
+
+
+def get_version(namespace):
+    """Returns the current version of a cache namespace.
+
+    A missing version starts from the current time rather than 1, so if
+    the version key gets evicted, the new version can't collide with
+    responses that were cached under an old one."""
+
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def invalidate(*namespaces):
+    """Drops every cached response in the given namespaces.
+
+    Responses are keyed on their namespace's version, so this just
+    bumps the version, no matter how many responses are cached. Old
+    responses are left to expire.
+
+    The bump happens now and again once the current transaction
+    commits, so that a request which read the old data before the
+    commit can't leave it cached under the new version."""
+
+    def bump():
+        for namespace in namespaces:
+            key = VERSION_KEY.format(namespace=namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                get_version(namespace)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_response_key(namespace, request):
+    """Returns the cache key of a response. Requests differing in their
+    query string or in the media type of the response (e.g. JSON with a
+    different indent) are cached separately."""
+
+    digest = hashlib.md5(
+        (request.accepted_media_type + "\n" + request.get_full_path()).encode("utf-8"),
+        usedforsecurity=False,
+    ).hexdigest()
+
+    return RESPONSE_KEY.format(
+        namespace=namespace,
+        version=get_version(namespace),
+        digest=digest,
+    )
+
+
+def render_response(request, response, *args, **kwargs):
+    """Renders a DRF response from inside its view, so that its bytes
+    can be cached. Returns the rendered response."""
+
+    if isinstance(response, Response):
+        view = request.parser_context["view"]
+        response = view.finalize_response(request, response, *args, **kwargs)
+        response.render()
+
+    return response
+
+
+def cache_response(namespace):
+    """Decorator caching the rendered bytes of a GET view.
+
+    Cached responses belong to a namespace, and are dropped together by
+    calling `invalidate(namespace)`; signals.py does this whenever the
+    underlying data changes. Only successful responses are cached, and
+    never for longer than `TASKBOARD_RESPONSE_CACHE_TIMEOUT` seconds.
+    Streamed responses are never cached.
+
+    Only JSON is cached. The cached views return the same data to every
+    user, but the browsable API's HTML also shows who's logged in, and
+    holds their CSRF token, so it must never be served to anyone else.
+
+    Like `conditional`, this goes under `api_view`, or on a ViewSet
+    method through `method_decorator`.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            timeout = settings.TASKBOARD_RESPONSE_CACHE_TIMEOUT
+            if request.method != "GET" or not timeout or wants_stream(request):
+                return view(request, *args, **kwargs)
+
+            if request.accepted_renderer.format != "json":
+                return view(request, *args, **kwargs)
+
+            key = get_response_key(namespace, request)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+
+            response = render_response(request, response, *args, **kwargs)
+            cache.set(key, (response.content, response["Content-Type"]), timeout)
+
+            return response
+
+        return wrapped_view
+
+    return decorator
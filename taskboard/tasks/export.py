@@ -0,0 +1,193 @@
+import csv
+import datetime
+import io
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Task
+from .pagination import KeysetPagination
+
+
+CHUNK_SIZE = 500
+"""Tasks fetched at a time. Every chunk takes two queries: one for the
+tasks and one for their comments."""
+
+ORDERING = ("datetime_edited", "uuid")
+"""Tasks are exported oldest edit first, walking the task_edited_idx
+index, so that a task edited during an export is still exported (at
+its new position) rather than skipped."""
+
+CSV_FIELDS = (
+    "uuid",
+    "summary",
+    "description",
+    "type",
+    "status",
+    "datetime_created",
+    "datetime_edited",
+    "last_activity_at",
+    "comment_count",
+    "author",
+    "author_name",
+    "project",
+    "project_type",
+    "comment_id",
+    "comment_poster",
+    "comment_date_created",
+    "comment_content",
+)
+
+
+def iter_task_chunks(edited_after=None, edited_before=None, chunk_size=CHUNK_SIZE):
+    """Yields every task as an export record, in lists of up to
+    `chunk_size`. `edited_after` is inclusive and `edited_before`
+    exclusive.
+
+    Chunks are found with keyset conditions rather than one long
+    running query, so no read is held open between chunks, and the
+    cost of a chunk doesn't depend on how far into the board it is.
+    """
+
+    queryset = Task.objects.select_related("author", "project").only(
+        "uuid",
+        "summary",
+        "description",
+        "type",
+        "status",
+        "datetime_created",
+        "datetime_edited",
+        "last_activity_at",
+        "comment_count",
+        "author__username",
+        "author__name",
+        "project__name",
+        "project__type",
+    ).order_by(*ORDERING)
+
+    if edited_after is not None:
+        queryset = queryset.filter(datetime_edited__gte=edited_after)
+    if edited_before is not None:
+        queryset = queryset.filter(datetime_edited__lt=edited_before)
+
+    keyset = KeysetPagination(ordering=ORDERING)
+    position = None
+
+    while True:
+        chunk = queryset
+        if position is not None:
+            chunk = chunk.filter(keyset.get_keyset_filter(ORDERING, position))
+
+        tasks = list(chunk[:chunk_size])
+        if not tasks:
+            return
+
+        comments = defaultdict(list)
+        for comment in Comment.objects \
+                .filter(task__in=[task.uuid for task in tasks]) \
+                .select_related("poster") \
+                .only("task_id", "content", "date_created", "poster__username") \
+                .order_by("task", "date_created", "id"):
+            comments[comment.task_id].append({
+                "id": comment.id,
+                "poster": comment.poster.username,
+                "date_created": comment.date_created,
+                "content": comment.content,
+            })
+
+        yield [get_record(task, comments[task.uuid]) for task in tasks]
+
+        # a short chunk is the last one
+        if len(tasks) < chunk_size:
+            return
+
+        position = keyset.get_position(tasks[-1])
+
+
+def get_record(task, comments):
+    project = task.project
+    return {
+        "uuid": task.uuid,
+        "summary": task.summary,
+        "description": task.description,
+        "type": task.type,
+        "status": task.status,
+        "datetime_created": task.datetime_created,
+        "datetime_edited": task.datetime_edited,
+        "last_activity_at": task.last_activity_at,
+        "comment_count": task.comment_count,
+        "author": task.author.username,
+        "author_name": task.author.name or task.author.username,
+        "project": project.name if project is not None else None,
+        "project_type": project.type if project is not None else None,
+        "comments": comments,
+    }
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds of datetimes, which DjangoJSONEncoder
+    drops, so that exported datetimes match the database exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def iter_ndjson(chunks):
+    """Yields chunks of records as lines of JSON, one task per line."""
+
+    encoder = ExportEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    for records in chunks:
+        yield "".join(encoder.encode(record) + "\n" for record in records)
+
+
+def iter_csv(chunks):
+    """Yields chunks of records as CSV, starting with a header row.
+
+    CSV is flat, so there's a row per comment, repeating the task's
+    columns. Tasks without comments get a single row with empty comment
+    columns."""
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+
+    def flush():
+        content = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return content
+
+    writer.writeheader()
+    yield flush()
+
+    for records in chunks:
+        for record in records:
+            row = {
+                field: to_csv(value) for field, value in record.items()
+                if field != "comments"
+            }
+            for comment in record["comments"] or [{}]:
+                writer.writerow(dict(
+                    row,
+                    comment_id=comment.get("id"),
+                    comment_poster=comment.get("poster"),
+                    comment_date_created=to_csv(comment.get("date_created")),
+                    comment_content=comment.get("content"),
+                ))
+
+        yield flush()
+
+
+def to_csv(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+FORMATS = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
+"""Export formats, as (generator, content type)."""
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from tasks.cache import invalidate
+from tasks.models import Comment, Task
+
+
+class Command(BaseCommand):
+    help = "Recalculates the comment_count and last_activity_at fields of " \
+        "every task from its comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tasks updated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        comments = Comment.objects.filter(task=OuterRef("pk")).order_by().values("task")
+        comment_count = Coalesce(
+            Subquery(comments.annotate(total=Count("id")).values("total")), 0,
+        )
+        last_activity_at = Coalesce(
+            Subquery(comments.annotate(latest=Max("date_created")).values("latest")),
+            F("datetime_created"),
+        )
+
+        # walk the tasks in primary key order, so every batch is a short
+        # transaction rather than locking the database for the whole run
+        updated = 0
+        last_uuid = None
+
+        while True:
+            queryset = Task.objects.order_by("uuid")
+            if last_uuid is not None:
+                queryset = queryset.filter(uuid__gt=last_uuid)
+
+            batch = list(queryset.values_list("uuid", flat=True)[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                updated += Task.objects.filter(uuid__in=batch).update(
+                    comment_count=comment_count,
+                    last_activity_at=last_activity_at,
+                )
+
+            last_uuid = batch[-1]
+
+        invalidate("tasks")
+
+        self.stdout.write(self.style.SUCCESS("Updated " + str(updated) + " tasks."))
@@ -0,0 +1,265 @@
+import json
+import platform
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tasks.models import Activity, Comment, Notification, Project, Task
+from users.models import TaskboardUser
+
+
+class Route:
+    """A request made by the benchmark."""
+
+    def __init__(self, name, method, path, data=None, auth=False, writes=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.auth = auth
+
+        self.writes = writes
+        """Requests that write to the database are made inside a
+        transaction that is rolled back, so every iteration starts from
+        the same data."""
+
+
+def percentile(values, percent):
+    """Returns a percentile of a sorted list, using the nearest rank
+    method."""
+
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "Makes requests to every route in taskboard/urls.py through the " \
+        "test client, and reports latency percentiles, query counts and " \
+        "peak memory per route. Run seed_taskboard first."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Number of timed requests per route.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=3,
+            help="Number of untimed requests per route made beforehand.",
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="Clear the cache before every request, to measure the " \
+                "views rather than the response cache.",
+        )
+        parser.add_argument(
+            "--password",
+            default="taskboard",
+            help="Password of the seeded users, used to request tokens.",
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            default=[],
+            help="Only benchmark routes whose name contains this. Can be " \
+                "given more than once.",
+        )
+        parser.add_argument(
+            "--output",
+            default="bench_results.json",
+            help="File the results are written to, as JSON.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations has to be at least 1.")
+
+        # errors are reported as 500s in the results, rather than
+        # stopping the run
+        self.client = Client(raise_request_exception=False)
+        self.options = options
+
+        routes = self.get_routes(options["password"])
+        if options["route"]:
+            routes = [
+                route for route in routes
+                if any(name in route.name for name in options["route"])
+            ]
+
+        results = {}
+        for route in routes:
+            results[route.name] = self.bench(route)
+            self.print_result(route.name, results[route.name])
+
+        output = {
+            "datetime": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "iterations": options["iterations"],
+            "cold": options["cold"],
+            "rows": {
+                "users": TaskboardUser.objects.count(),
+                "projects": Project.objects.count(),
+                "tasks": Task.objects.count(),
+                "comments": Comment.objects.count(),
+                "notifications": Notification.objects.count(),
+                "activity": Activity.objects.count(),
+            },
+            "results": results,
+        }
+
+        with open(options["output"], "w") as file:
+            json.dump(output, file, indent=2)
+
+        self.stdout.write(self.style.SUCCESS("Wrote results to " + options["output"] + "."))
+
+    def get_routes(self, password):
+        """Returns the routes to benchmark, filled in with the busiest
+        rows of the current database."""
+
+        task = Task.objects.order_by("-comment_count").first()
+        user = TaskboardUser.objects.annotate(total=Count("activity")) \
+            .order_by("-total").first()
+        project = Project.objects.first()
+        comment = Comment.objects.order_by("id").first()
+
+        if task is None or user is None or project is None or comment is None:
+            raise CommandError("The database is missing data to benchmark " \
+                "with. Run seed_taskboard first.")
+
+        self.token = str(RefreshToken.for_user(user).access_token)
+        refresh = str(RefreshToken.for_user(user))
+        word = task.summary.split()[0]
+
+        return [
+            Route("api-root", "get", "/api/"),
+            Route("tasks-list", "get", "/api/tasks/"),
+            Route("tasks-list-edited", "get", "/api/tasks/?sort=edited"),
+            Route("tasks-list-activity", "get", "/api/tasks/?sort=activity"),
+            Route("tasks-list-filtered", "get", "/api/tasks/?filter=status:REVW&filter=type:FEAT"),
+            Route("tasks-list-deep", "get", "/api/tasks/?page_size=100"),
+            Route("tasks-search", "get", "/api/tasks/search/?q=" + word),
+            Route("tasks-detail", "get", "/api/tasks/" + str(task.uuid) + "/"),
+            Route("tasks-detail-newest", "get", "/api/tasks/" + str(task.uuid) + "/?comments=10"),
+            Route("tasks-comments", "get", "/api/tasks/" + str(task.uuid) + "/comments/"),
+            Route("tasks-create", "post", "/api/tasks/", {
+                "summary": "Benchmark task",
+                "description": "Created by bench_api.",
+                "type": "TASK",
+                "project": project.name,
+            }, auth=True, writes=True),
+            Route("task-types", "get", "/api/tasks/types/"),
+            Route("task-status-types", "get", "/api/tasks/status/"),
+            Route("projects-list", "get", "/api/projects/"),
+            Route("projects-detail", "get", "/api/projects/" + project.name + "/"),
+            Route("comments-list", "get", "/api/comments/"),
+            Route("comments-detail", "get", "/api/comments/" + str(comment.pk) + "/"),
+            Route("comments-create", "post", "/api/comments/", {
+                "task": str(task.uuid),
+                "content": "Benchmark comment",
+            }, auth=True, writes=True),
+            Route("profiles-detail", "get", "/api/profiles/" + user.username + "/"),
+            Route("profiles-update", "put", "/api/profiles/" + user.username + "/", {
+                "title": "Benchmarker",
+            }, auth=True, writes=True),
+            Route("token", "post", "/api/token/", {
+                "username": user.username,
+                "password": password,
+            }),
+            Route("token-refresh", "post", "/api/token/refresh/", {"refresh": refresh}),
+            Route("token-status", "get", "/api/token/status/", auth=True),
+            Route("register", "post", "/api/register/", {
+                "username": "bench_register",
+                "password": "bench_register_password",
+            }, writes=True),
+            Route("notifications", "get", "/api/user/" + user.username + "/notifications/"),
+            Route("profile", "get", "/api/user/" + user.username + "/profile/"),
+            Route("activity", "get", "/api/user/" + user.username + "/activity/"),
+        ]
+
+    def request(self, route):
+        if self.options["cold"]:
+            cache.clear()
+
+        kwargs = {}
+        if route.data is not None:
+            kwargs["data"] = json.dumps(route.data)
+            kwargs["content_type"] = "application/json"
+        if route.auth:
+            kwargs["HTTP_AUTHORIZATION"] = "Bearer " + self.token
+
+        method = getattr(self.client, route.method)
+
+        if not route.writes:
+            return method(route.path, **kwargs)
+
+        with transaction.atomic():
+            response = method(route.path, **kwargs)
+            transaction.set_rollback(True)
+
+        return response
+
+    def bench(self, route):
+        for n in range(self.options["warmup"]):
+            self.request(route)
+
+        timings = []
+        for n in range(self.options["iterations"]):
+            start = time.perf_counter()
+            response = self.request(route)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        # queries and memory are measured on separate requests, so that
+        # neither adds overhead to the timings. the captured queries are
+        # read from the connection's log, which the next request clears,
+        # so they're counted straight away
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(route)
+        query_count = len(queries)
+
+        tracemalloc.start()
+        try:
+            self.request(route)
+            size, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+
+        return {
+            "method": route.method.upper(),
+            "path": route.path,
+            "status": response.status_code,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "queries": query_count,
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            name.ljust(24) +
+            str(result["status"]).rjust(4) +
+            (str(result["p50_ms"]) + "ms").rjust(12) +
+            (str(result["p95_ms"]) + "ms").rjust(12) +
+            (str(result["p99_ms"]) + "ms").rjust(12) +
+            (str(result["queries"]) + "q").rjust(6) +
+            (str(result["peak_memory_kb"]) + "KiB").rjust(14)
+        )
@@ -0,0 +1,58 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from taskboard import slowqueries
+
+
+class Command(BaseCommand):
+    help = "Prints the slow query log, newest first. The log is kept in " \
+        "the cache, so this only sees the queries of web workers when " \
+        "the file or database cache backend is used."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Number of entries to print.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print the entries as JSON instead.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Empty the log after printing it.",
+        )
+
+    def handle(self, *args, **options):
+        entries = slowqueries.get_entries()[:options["limit"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(entries, indent=2))
+        elif not entries:
+            self.stdout.write("No queries slower than " + \
+                str(settings.TASKBOARD_SLOW_QUERY_MS) + "ms were logged.")
+
+        if not options["json"]:
+            for entry in entries:
+                self.print_entry(entry)
+
+        if options["clear"]:
+            slowqueries.clear()
+
+    def print_entry(self, entry):
+        self.stdout.write(self.style.WARNING(
+            str(entry["duration_ms"]) + "ms in " + str(entry["view"]) + \
+            " at " + entry["datetime"]
+        ))
+        self.stdout.write("  " + entry["sql"])
+        if entry["params"]:
+            self.stdout.write("  params: " + json.dumps(entry["params"]))
+        for line in entry["plan"] or ():
+            self.stdout.write("    " + line)
+        self.stdout.write("")
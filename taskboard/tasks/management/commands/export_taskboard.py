@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from tasks import export
+
+
+class Command(BaseCommand):
+    help = "Exports every task, with its comments, project and author, " \
+        "as NDJSON (a task per line) or CSV (a row per comment)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=sorted(export.FORMATS),
+            default="ndjson",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write the export to. Defaults to stdout.",
+        )
+        parser.add_argument(
+            "--edited-after",
+            help="Only export tasks last edited at or after this ISO 8601 datetime.",
+        )
+        parser.add_argument(
+            "--edited-before",
+            help="Only export tasks last edited before this ISO 8601 datetime.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=export.CHUNK_SIZE,
+            help="Number of tasks fetched at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size has to be at least 1.")
+
+        bounds = {}
+        for name in ("edited_after", "edited_before"):
+            if options[name] is None:
+                continue
+
+            try:
+                bounds[name] = parse_datetime(options[name])
+            except ValueError:
+                bounds[name] = None
+
+            if bounds[name] is None:
+                raise CommandError(options[name] + " is not a valid datetime.")
+
+        generator, content_type = export.FORMATS[options["format"]]
+        chunks = export.iter_task_chunks(chunk_size=options["chunk_size"], **bounds)
+
+        if options["output"] == "-":
+            for content in generator(chunks):
+                self.stdout.write(content, ending="")
+            return
+
+        with open(options["output"], "w", newline="") as file:
+            for content in generator(chunks):
+                file.write(content)
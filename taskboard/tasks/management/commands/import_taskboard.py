@@ -0,0 +1,327 @@
+import datetime
+import json
+import sys
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tasks import search
+from tasks.bulk import insert_rows
+from tasks.cache import invalidate
+from tasks.notifications import watch
+from tasks.models import Activity, Comment, Project, Task
+from users.models import TaskboardUser
+
+
+class Command(BaseCommand):
+    help = "Imports tasks and their comments from NDJSON, in the format " \
+        "written by export_taskboard. Rows are inserted in bulk, a batch " \
+        "per transaction, so no signals are sent: comment counts, " \
+        "activity, watchers and the search index are filled in directly, " \
+        "and no notifications are sent for the imported comments. Tasks " \
+        "whose UUID already exists are skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input",
+            help="NDJSON file to import, or - for stdin.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of tasks inserted per transaction.",
+        )
+        parser.add_argument(
+            "--create-missing",
+            action="store_true",
+            help="Create the authors, comment posters and projects that " \
+                "don't exist yet, instead of skipping their tasks. Created " \
+                "users can't log in until they're given a password.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be at least 1.")
+
+        self.create_missing = options["create_missing"]
+        self.imported = {"tasks": 0, "comments": 0}
+        self.skipped = 0
+
+        # every user and project is looked up once, up front, rather
+        # than once per row
+        self.users = dict(TaskboardUser.objects.values_list("username", "id"))
+        self.projects = dict(Project.objects.values_list("name", "id"))
+
+        start = time.perf_counter()
+
+        if options["input"] == "-":
+            self.import_file(sys.stdin.buffer, options["batch_size"])
+        else:
+            try:
+                with open(options["input"], "rb") as file:
+                    self.import_file(file, options["batch_size"])
+            except OSError as error:
+                raise CommandError("Can't read " + options["input"] + ": " + str(error))
+
+        invalidate("tasks", "projects", "activity")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            "Imported " + str(self.imported["tasks"]) + " tasks and " + \
+            str(self.imported["comments"]) + " comments in " + \
+            format(elapsed, ".1f") + "s. Skipped " + str(self.skipped) + " tasks."
+        ))
+
+    def import_file(self, file, batch_size):
+        """Imports the records of a file opened in binary. Lines are
+        decoded one at a time, so one that isn't UTF-8 is skipped like
+        any other bad line instead of aborting the import."""
+
+        batch = []
+
+        for number, line in enumerate(file, start=1):
+            if line.strip() == b"":
+                continue
+
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as error:
+                self.skip(number, "invalid UTF-8 (" + str(error) + ")")
+                continue
+
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected an object")
+            except ValueError as error:
+                self.skip(number, "invalid JSON (" + str(error) + ")")
+                continue
+
+            batch.append((number, record))
+            if len(batch) >= batch_size:
+                self.import_batch(batch)
+                batch = []
+
+        if batch:
+            self.import_batch(batch)
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write("Line " + str(number) + ": " + reason + ", skipped.")
+
+    def import_batch(self, batch):
+        if self.create_missing:
+            self.create_users(batch)
+            self.create_projects(batch)
+
+        existing = set(Task.objects.filter(
+            uuid__in=[self.get_uuid(record) for number, record in batch],
+        ).order_by().values_list("uuid", flat=True))
+
+        tasks = []
+        comments = []
+        activity = []
+
+        for number, record in batch:
+            try:
+                task, task_comments = self.build_task(record, existing)
+            except ValueError as error:
+                self.skip(number, str(error))
+                continue
+
+            existing.add(task.uuid)
+            tasks.append(task)
+            comments += task_comments
+
+            activity.append(Activity(
+                user_id=task.author_id,
+                type=Activity.Type.NEW_TASK,
+                task_id=task.uuid,
+                datetime_created=task.datetime_created,
+            ))
+            activity += [
+                Activity(
+                    user_id=comment.poster_id,
+                    type=Activity.Type.NEW_COMMENT,
+                    task_id=comment.task_id,
+                    datetime_created=comment.date_created,
+                )
+                for comment in task_comments
+            ]
+
+        with transaction.atomic():
+            insert_rows(Task, tasks)
+            insert_rows(Comment, comments)
+            insert_rows(Activity, activity)
+            search.index_tasks(tasks)
+            search.index_task_comments([task.uuid for task in tasks if task.comment_count])
+            watch(
+                [(task.uuid, task.author_id) for task in tasks] + \
+                [(comment.task_id, comment.poster_id) for comment in comments]
+            )
+
+        self.imported["tasks"] += len(tasks)
+        self.imported["comments"] += len(comments)
+
+    def get_uuid(self, record):
+        try:
+            return uuid.UUID(str(record.get("uuid")))
+        except ValueError:
+            return None
+
+    def get_datetime(self, record, field, default):
+        value = record.get(field)
+        if value is None:
+            return default
+
+        try:
+            parsed = parse_datetime(str(value))
+        except ValueError:
+            parsed = None
+
+        if parsed is None:
+            raise ValueError(field + " is not a valid datetime")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+
+        return parsed
+
+    def build_task(self, record, existing):
+        """Returns an unsaved task and its comments, built from a
+        record. Raises ValueError if the record can't be imported."""
+
+        task_uuid = self.get_uuid(record) if "uuid" in record else uuid.uuid4()
+        if task_uuid is None:
+            raise ValueError("uuid is not a valid UUID")
+        if task_uuid in existing:
+            raise ValueError("task " + str(task_uuid) + " already exists")
+
+        author = record.get("author")
+        if not isinstance(author, str) or author not in self.users:
+            raise ValueError("author " + str(author) + " doesn't exist")
+
+        type = record.get("type", Task.Type.TASK)
+        if type not in Task.Type.values:
+            raise ValueError(str(type) + " is not a valid type")
+
+        # like task_pre_save_handler, projects can't be in projects
+        project = record.get("project")
+        if type == Task.Type.PROJECT:
+            project = None
+        if project is not None and (not isinstance(project, str) or project not in self.projects):
+            raise ValueError("project " + str(project) + " doesn't exist")
+
+        status = record.get("status", Task.Status.REVIEWING)
+        if status not in Task.Status.values:
+            raise ValueError(str(status) + " is not a valid status")
+
+        now = timezone.now()
+        datetime_created = self.get_datetime(record, "datetime_created", now)
+
+        comments = []
+        for comment in self.get_comments(record):
+            poster = comment.get("poster")
+            if not isinstance(poster, str) or poster not in self.users:
+                raise ValueError("comment poster " + str(poster) + " doesn't exist")
+
+            comments.append(Comment(
+                task_id=task_uuid,
+                poster_id=self.users[poster],
+                content=comment.get("content") or "",
+                date_created=self.get_datetime(comment, "date_created", datetime_created),
+            ))
+
+        last_activity_at = max(
+            [datetime_created] + [comment.date_created for comment in comments]
+        )
+
+        task = Task(
+            uuid=task_uuid,
+            summary=record.get("summary") or "",
+            description=record.get("description") or "",
+            author_id=self.users[author],
+            project_id=self.projects[project] if project is not None else None,
+            type=type,
+            status=status,
+            datetime_created=datetime_created,
+            datetime_edited=self.get_datetime(record, "datetime_edited", datetime_created),
+            comment_count=len(comments),
+            last_activity_at=self.get_datetime(record, "last_activity_at", last_activity_at),
+        )
+
+        return task, comments
+
+    def get_comments(self, record):
+        """Returns the comments of a record. Raises ValueError if they
+        aren't a list of objects."""
+
+        comments = record.get("comments") or []
+        if not isinstance(comments, list):
+            raise ValueError("comments is not a list")
+
+        for position, comment in enumerate(comments, start=1):
+            if not isinstance(comment, dict):
+                raise ValueError("comment " + str(position) + " is not an object")
+
+        return comments
+
+    def create_users(self, batch):
+        usernames = set()
+        for number, record in batch:
+            try:
+                comments = self.get_comments(record)
+            except ValueError:
+                # the record is skipped, and reported, by build_task
+                continue
+
+            names = [record.get("author")] + [comment.get("poster") for comment in comments]
+            usernames.update(name for name in names if isinstance(name, str) and name)
+
+        missing = [username for username in usernames if username not in self.users]
+        if not missing:
+            return
+
+        password = make_password(None)
+        TaskboardUser.objects.bulk_create([
+            TaskboardUser(username=username, password=password)
+            for username in missing
+        ])
+
+        # bulk_create only sets primary keys on some databases
+        self.users.update(
+            TaskboardUser.objects.filter(username__in=missing).values_list("username", "id")
+        )
+
+    def create_projects(self, batch):
+        missing = {
+            record.get("project") for number, record in batch
+            if isinstance(record.get("project"), str) and \
+                record.get("type") != Task.Type.PROJECT and \
+                record.get("project") not in self.projects
+        }
+        if not missing:
+            return
+
+        projects = []
+        for number, record in batch:
+            name = record.get("project")
+            if name in missing:
+                missing.discard(name)
+                type = record.get("project_type")
+                projects.append(Project(
+                    name=name,
+                    summary="",
+                    type=type if type in Project.Type.values else Project.Type.OTHER,
+                ))
+
+        Project.objects.bulk_create(projects)
+        self.projects.update(
+            Project.objects.filter(name__in=[project.name for project in projects]) \
+                .values_list("name", "id")
+        )
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from tasks import outbox
+
+
+class Command(BaseCommand):
+    help = "Carries out the events queued in the outbox: notifying the " \
+        "watchers of new comments, and recording activity. Runs until " \
+        "interrupted, unless --once is given. Failed events are retried " \
+        "with backoff. Only needed when the TASKBOARD_OUTBOX_SYNC " \
+        "setting, read from the OUTBOX_SYNC environment variable, is off."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of threads claiming and carrying out events.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help="Number of events claimed, and carried out in one " \
+                "transaction, at a time.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds a thread waits before looking again, once the " \
+                "outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Carry out the events that are due, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads has to be at least 1.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size has to be at least 1.")
+
+        if options["once"]:
+            handled = outbox.drain(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                "Handled " + str(handled) + " events."
+            ))
+            return
+
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.handled = 0
+        self.failed = 0
+
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(options["batch_size"], options["poll_interval"]),
+                name="outbox-" + str(n),
+            )
+            for n in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+
+        self.stdout.write(
+            "Running " + str(len(threads)) + " threads. Press Ctrl+C to stop."
+        )
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping once the current batches are done...")
+            self.stopping.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            "Handled " + str(self.handled) + " events, of which " + \
+            str(self.failed) + " failed and will be retried."
+        ))
+
+    def work(self, batch_size, poll_interval):
+        """Claims and carries out batches of events until the command is
+        stopped. Each thread has its own database connection."""
+
+        try:
+            while not self.stopping.is_set():
+                try:
+                    events = outbox.claim(batch_size)
+                    failed = outbox.process(events)
+                except DatabaseError as error:
+                    # e.g. SQLite being locked by another writer. the
+                    # events stay in the outbox, and are claimed again
+                    # once their lease runs out
+                    self.stderr.write("Couldn't carry out events: " + str(error))
+                    events = []
+
+                if not events:
+                    self.stopping.wait(poll_interval)
+                    continue
+
+                with self.lock:
+                    self.handled += len(events)
+                    self.failed += failed
+        finally:
+            connection.close()
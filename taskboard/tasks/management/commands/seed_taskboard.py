@@ -0,0 +1,223 @@
+import random
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from tasks import search
+from tasks.cache import invalidate
+from tasks.models import Activity, Comment, Notification, Project, Task
+from tasks.notifications import watch
+from users.models import TaskboardUser
+
+
+WORDS = (
+    "add", "fix", "button", "login", "page", "music", "track", "level",
+    "boss", "menu", "sound", "volume", "crash", "save", "load", "score",
+    "profile", "comment", "task", "board", "theme", "dark", "mode",
+    "mobile", "layout", "sprite", "shader", "render", "slow", "fast",
+    "search", "filter", "sort", "export", "import", "upload", "avatar",
+    "notification", "email", "password", "reset", "project", "website",
+    "game", "album", "song", "mix", "master", "bug", "feature", "idea",
+)
+
+
+class Command(BaseCommand):
+    help = "Fills the database with generated users, projects, tasks, " \
+        "comments, notifications and activity, for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--projects", type=int, default=10)
+        parser.add_argument("--tasks", type=int, default=1000)
+        parser.add_argument("--comments", type=int, default=5000)
+        parser.add_argument("--notifications", type=int, default=2000)
+        parser.add_argument("--activity", type=int, default=2000)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows inserted per bulk_create.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=None,
+            help="Seed for the random generator, for repeatable data.",
+        )
+        parser.add_argument(
+            "--password",
+            default="taskboard",
+            help="Password given to every generated user.",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        users = self.create_users(options["users"], options["password"])
+        projects = self.create_projects(options["projects"])
+
+        if options["tasks"] and not users:
+            self.stderr.write("Can't create tasks without any users.")
+            return
+
+        tasks = self.create_tasks(options["tasks"], options["comments"], users, projects)
+        self.create_comments(options["comments"], tasks, users)
+        self.create_notifications(options["notifications"], tasks, users)
+        self.create_activity(options["activity"], tasks, users)
+
+        invalidate("tasks", "projects", "activity")
+
+        self.stdout.write(self.style.SUCCESS(
+            "Created " + str(len(users)) + " users, " + \
+            str(len(projects)) + " projects and " + \
+            str(len(tasks)) + " tasks, along with their comments, " + \
+            "notifications and activity."
+        ))
+
+    def sentence(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return " ".join(words).capitalize()
+
+    def batches(self, items):
+        for start in range(0, len(items), self.batch_size):
+            yield items[start:start + self.batch_size]
+
+    def next_number(self, queryset, field, prefix):
+        """Returns the first free number for generated names, so the
+        command can be run more than once."""
+
+        return queryset.filter(**{field + "__startswith": prefix}).count() + 1
+
+    def create_users(self, count, password):
+        # hashing is slow on purpose, so every user shares one hash
+        password = make_password(password)
+        start = self.next_number(TaskboardUser.objects, "username", "seed_")
+
+        users = [
+            TaskboardUser(
+                username="seed_" + str(start + n),
+                name=self.sentence(1, 2),
+                title=self.sentence(1, 3),
+                about_me=self.sentence(4, 12),
+                password=password,
+            )
+            for n in range(count)
+        ]
+
+        for batch in self.batches(users):
+            with transaction.atomic():
+                TaskboardUser.objects.bulk_create(batch)
+
+        return users
+
+    def create_projects(self, count):
+        start = self.next_number(Project.objects, "name", "Seed project ")
+
+        projects = [
+            Project(
+                name="Seed project " + str(start + n),
+                summary=self.sentence(4, 10),
+                type=self.random.choice(Project.Type.values),
+            )
+            for n in range(count)
+        ]
+
+        for batch in self.batches(projects):
+            with transaction.atomic():
+                Project.objects.bulk_create(batch)
+
+        return projects
+
+    def create_tasks(self, count, comment_count, users, projects):
+        now = timezone.now()
+
+        # comments are spread over the tasks up front, so that each task
+        # can be created with the right comment_count
+        tasks = []
+        for n in range(count):
+            type = self.random.choice(Task.Type.values)
+            project = None
+            if type != Task.Type.PROJECT and projects:
+                project = self.random.choice(projects)
+
+            tasks.append(Task(
+                summary=self.sentence(3, 10),
+                description=self.sentence(10, 60),
+                author=self.random.choice(users),
+                project=project,
+                type=type,
+                status=self.random.choice(Task.Status.values),
+                last_activity_at=now,
+            ))
+
+        if tasks:
+            self.comment_targets = self.random.choices(range(len(tasks)), k=comment_count)
+            for index, total in Counter(self.comment_targets).items():
+                tasks[index].comment_count = total
+
+        for batch in self.batches(tasks):
+            with transaction.atomic():
+                Task.objects.bulk_create(batch)
+                search.index_tasks(batch)
+                watch([(task.uuid, task.author_id) for task in batch])
+
+        return tasks
+
+    def create_comments(self, count, tasks, users):
+        if not tasks:
+            return
+
+        comments = [
+            Comment(
+                task=tasks[index],
+                poster=self.random.choice(users),
+                content=self.sentence(3, 30),
+            )
+            for index in self.comment_targets
+        ]
+
+        for batch in self.batches(comments):
+            with transaction.atomic():
+                Comment.objects.bulk_create(batch)
+                search.index_comments(batch)
+                watch([(comment.task_id, comment.poster_id) for comment in batch])
+
+    def create_notifications(self, count, tasks, users):
+        if not users:
+            return
+
+        notifications = []
+        for n in range(count):
+            task = self.random.choice(tasks) if tasks else None
+            notifications.append(Notification(
+                receiver=self.random.choice(users),
+                message=self.sentence(5, 15),
+                is_read=self.random.random() < 0.5,
+                type=Notification.Type.TASK if task else Notification.Type.TEXT_ONLY,
+                location=str(task.uuid) if task else "",
+            ))
+
+        for batch in self.batches(notifications):
+            with transaction.atomic():
+                Notification.objects.bulk_create(batch)
+
+    def create_activity(self, count, tasks, users):
+        if not users:
+            return
+
+        activity = [
+            Activity(
+                user=self.random.choice(users),
+                type=self.random.choice(Activity.Type.values),
+                task=self.random.choice(tasks) if tasks else None,
+            )
+            for n in range(count)
+        ]
+
+        for batch in self.batches(activity):
+            with transaction.atomic():
+                Activity.objects.bulk_create(batch)
@@ -0,0 +1,48 @@
+# Creates the FTS5 table used by tasks/search.py, then fills it in with
+# the existing tasks and comments.
+
+from django.db import migrations
+
+
+def populate_search_index(apps, schema_editor):
+    Task = apps.get_model("tasks", "Task")
+    Comment = apps.get_model("tasks", "Comment")
+
+    # same rowids as tasks.search.task_rowid and comment_rowid
+    tasks = [
+        (task.uuid.int & 0x7FFFFFFFFFFFFFFF, task.uuid.hex, task.summary or "", task.description or "")
+        for task in Task.objects.only("uuid", "summary", "description").iterator()
+    ]
+    comments = [
+        (-comment.id, comment.task_id.hex, comment.content or "")
+        for comment in Comment.objects.only("id", "task_id", "content").iterator()
+    ]
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO tasks_search (rowid, task_uuid, summary, description, content) "
+            "VALUES (%s, %s, %s, %s, '')",
+            tasks,
+        )
+        cursor.executemany(
+            "INSERT INTO tasks_search (rowid, task_uuid, summary, description, content) "
+            "VALUES (%s, %s, '', '', %s)",
+            comments,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0029_comment_comment_task_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE VIRTUAL TABLE tasks_search USING fts5("
+                "task_uuid UNINDEXED, summary, description, content, "
+                "tokenize = 'porter unicode61 remove_diacritics 2')",
+            reverse_sql="DROP TABLE tasks_search",
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:06
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_task_activity(apps, schema_editor):
+    # same as the backfill_task_activity command
+    Task = apps.get_model("tasks", "Task")
+    Comment = apps.get_model("tasks", "Comment")
+
+    comments = Comment.objects.filter(task=OuterRef("pk")).order_by().values("task")
+
+    Task.objects.update(
+        comment_count=Coalesce(
+            Subquery(comments.annotate(total=Count("id")).values("total")), 0,
+        ),
+        last_activity_at=Coalesce(
+            Subquery(comments.annotate(latest=Max("date_created")).values("latest")),
+            F("datetime_created"),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0030_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['last_activity_at', 'uuid'], name='task_activity_idx'),
+        ),
+        migrations.RunPython(backfill_task_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-18 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_watchers(apps, schema_editor):
+    # every author watches their tasks, and every commenter the tasks
+    # they commented on, from their first comment. one statement, so it
+    # doesn't load the comments into memory
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO tasks_taskwatcher (task_id, user_id, datetime_created) "
+            "SELECT task_id, user_id, MIN(created) FROM ("
+                "SELECT uuid AS task_id, author_id AS user_id, datetime_created AS created "
+                "FROM tasks_task "
+                "UNION ALL "
+                "SELECT task_id, poster_id, date_created FROM tasks_comment"
+            ") AS watchers GROUP BY task_id, user_id"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0033_coalesced_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskWatcher',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('datetime_created', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watchers', to='tasks.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watching', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskwatcher',
+            constraint=models.UniqueConstraint(fields=('task', 'user'), name='taskwatcher_task_user_unique'),
+        ),
+        migrations.RunPython(add_watchers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0035_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='related_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0036_task_related_changed_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='type',
+            field=models.CharField(choices=[('NCMT', 'New Comment'), ('NTSK', 'New Task'), ('TKSC', 'Task Status Change')], max_length=4),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 
@@ -129,6 +130,49 @@ class Task(models.Model):
 
     class Meta:
         ordering = ['-datetime_created']
+        indexes = [
+            # keys for paginating the task list, one per sort option.
+            # the uuid is there to break ties between equal datetimes
+            models.Index(
+                fields=["datetime_created", "uuid"],
+                name="task_created_idx",
+            ),
+            models.Index(
+                fields=["datetime_edited", "uuid"],
+                name="task_edited_idx",
+            ),
+            # same keys, prefixed with the columns the task list can be
+            # filtered on, so a filtered page is still a single range.
+            # author lookups go through the foreign key index instead
+            models.Index(
+                fields=["status", "datetime_created", "uuid"],
+                name="task_status_created_idx",
+            ),
+            models.Index(
+                fields=["status", "datetime_edited", "uuid"],
+                name="task_status_edited_idx",
+            ),
+            models.Index(
+                fields=["type", "datetime_created", "uuid"],
+                name="task_type_created_idx",
+            ),
+            models.Index(
+                fields=["type", "datetime_edited", "uuid"],
+                name="task_type_edited_idx",
+            ),
+            models.Index(
+                fields=["project", "datetime_created", "uuid"],
+                name="task_project_created_idx",
+            ),
+            models.Index(
+                fields=["project", "datetime_edited", "uuid"],
+                name="task_project_edited_idx",
+            ),
+            models.Index(
+                fields=["last_activity_at", "uuid"],
+                name="task_activity_idx",
+            ),
+        ]
 
     uuid = models.UUIDField( 
         primary_key = True, 
@@ -198,6 +242,33 @@ class Task(models.Model):
     )
     """The last time the task was edited."""
 
+    comment_count = models.PositiveIntegerField(
+        default=0,
+    )
+    """Number of comments on the task.
+    
+    Kept up to date by the comment signal handlers, so that listing
+    tasks doesn't need to count comments. Can be recalculated with the
+    backfill_task_activity command."""
+
+    last_activity_at = models.DateTimeField(
+        default=timezone.now,
+    )
+    """The last time the task was created or commented on. Deleting a
+    comment moves it back to the newest comment that's left.
+    
+    Kept up to date the same way as comment_count."""
+
+    related_changed_at = models.DateTimeField(
+        default=timezone.now,
+    )
+    """The last time something shown with the task, other than its own
+    fields, changed: a comment being posted, edited or deleted, or the
+    name of a comment poster, the author or the project.
+
+    Only ever moves forward, so that the detail view's Last-Modified and
+    ETag change with it. Kept up to date by the signal handlers."""
+
     def __str__(self):
         return self.summary
 
@@ -205,6 +276,17 @@ class Task(models.Model):
 class Comment(models.Model):
     """Comment on a task."""
 
+    class Meta:
+        indexes = [
+            # comments are always read per task in date order. SQLite
+            # appends the rowid (the id) to every index entry, so this
+            # also covers (task, date_created, id)
+            models.Index(
+                fields=["task", "date_created"],
+                name="comment_task_created_idx",
+            ),
+        ]
+
     poster = models.ForeignKey(
         get_user_model(),
         on_delete=models.CASCADE,
@@ -234,13 +316,81 @@ class Comment(models.Model):
         return str(self.poster) + ": " + str(self.content)
 
 
+class TaskWatcher(models.Model):
+    """A user watching a task, who's notified of new comments and status
+    changes on it.
+
+    Authors watch their tasks, and commenters the tasks they comment on,
+    automatically. Anyone can watch or unwatch a task through the API.
+    """
+
+    class Meta:
+        constraints = [
+            # also the index notifications are fanned out with, reading
+            # a task's watchers in one range
+            models.UniqueConstraint(
+                fields=["task", "user"],
+                name="taskwatcher_task_user_unique",
+            ),
+        ]
+
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="watchers",
+    )
+    """The task being watched."""
+
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="watching",
+    )
+    """The user watching the task."""
+
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    """Datetime that the user started watching the task."""
+
+    def __str__(self):
+        return str(self.user) + " watching " + str(self.task)
+
+
 class Notification(models.Model):
     """Notifications for users of the application.
     
     Notifications are created by the server whenever a relevant action
     is performed.
+
+    A user has at most one unread notification per task. Further events
+    on that task are added to it, by `notify_watchers` in
+    notifications.py, rather than creating another row, so a busy task
+    doesn't flood its author's inbox.
     """
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["receiver", "task"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_task_unique",
+            ),
+        ]
+        indexes = [
+            # the inbox is read per user, newest first. like the comment
+            # index, SQLite appends the id, which breaks ties
+            models.Index(
+                fields=["receiver", "datetime_created"],
+                name="notification_inbox_idx",
+            ),
+            # only unread notifications are counted, and there are far
+            # fewer of them than read ones
+            models.Index(
+                fields=["receiver"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+        ]
+
     class Type(models.TextChoices):
         TEXT_ONLY = "MSG", _("Message"),
         """Notification that simply provides a status update, with no
@@ -297,6 +447,28 @@ class Notification(models.Model):
     different page. The contents of this field is dependant on the
     type of notification."""
 
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        blank=True,
+        null=True,
+    )
+    """The task the notification is about, if any."""
+
+    actor = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        related_name="+",
+        blank=True,
+        null=True,
+    )
+    """The user behind the latest event, if any."""
+
+    event_count = models.PositiveIntegerField(default=1)
+    """Number of events collapsed into this notification since it was
+    last read."""
+
     def __str__(self):
         return "for: " + str(self.receiver) + "; message: " + str(self.message)
     
@@ -342,4 +514,71 @@ class Activity(models.Model):
     """Datetime that the notification was created."""
 
     def __str__(self):
-        return "from: " + str(self.user) + "; type: " + str(self.type)
\ No newline at end of file
+        return "from: " + str(self.user) + "; type: " + str(self.type)
+
+class OutboxEvent(models.Model):
+    """Side effects of a save, waiting to be carried out.
+
+    The signal handlers write an event in the same transaction as the
+    comment or task that caused it, rather than doing the work there and
+    then. The run_taskboard_worker command carries the events out in the
+    background, and deletes them once they're done. See outbox.py.
+    """
+
+    class Meta:
+        indexes = [
+            # workers claim the oldest events that are due
+            models.Index(
+                fields=["available_at", "id"],
+                name="outbox_available_idx",
+            ),
+        ]
+
+    class Type(models.TextChoices):
+        """Enumeration for the different kinds of event."""
+
+        NEW_COMMENT = "NCMT", _("New Comment"),
+        """A comment was posted. Notifies the task's watchers, and adds
+        the poster's activity."""
+
+        NEW_TASK    = "NTSK", _("New Task"),
+        """A task was created. Adds the author's activity."""
+
+        STATUS_CHANGE = "TKSC", _("Task Status Change"),
+        """A saved task's status changed. Notifies the task's author and
+        watchers, and adds the activity of whoever changed it."""
+
+    type = models.CharField(
+        max_length=4,
+        choices=Type,
+    )
+    """The type of event."""
+
+    payload = models.JSONField()
+    """What the event is about, e.g. the ids of the comment and task."""
+
+    datetime_created = models.DateTimeField(auto_now_add=True)
+    """Datetime that the event happened."""
+
+    available_at = models.DateTimeField(default=timezone.now)
+    """When the event can next be claimed by a worker. Pushed back while
+    a worker holds it, and after a failed attempt."""
+
+    lease = models.CharField(
+        max_length=32,
+        blank=True,
+        default="",
+    )
+    """Token of the worker holding the event, if any."""
+
+    attempts = models.PositiveIntegerField(default=0)
+    """Number of failed attempts at carrying the event out."""
+
+    last_error = models.TextField(
+        blank=True,
+        default="",
+    )
+    """The error from the last failed attempt."""
+
+    def __str__(self):
+        return str(self.type) + " " + str(self.payload)
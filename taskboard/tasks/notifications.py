@@ -0,0 +1,92 @@
+"""Coalesced task notifications, fanned out to a task's author and
+watchers.
+
+A user has at most one unread notification per task, enforced by the
+notification_unread_task_unique partial unique index. An event on a
+task inserts that row for its author and each of its watchers, or, if
+it's already there, bumps its event count and makes it about the latest
+event. Once the notification is read, the next event on the task starts
+a new one.
+
+Each event is a single INSERT ... SELECT over the task's watchers and
+its author, with an upsert, so notifying them takes the same one
+statement however many watchers there are. It's written in SQL since
+the ORM can't insert from a select, or target a partial unique index
+with ON CONFLICT. The syntax is shared by SQLite and PostgreSQL.
+"""
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Notification, Task, TaskWatcher
+
+
+def notify_watchers(events):
+    """Notifies the authors and watchers of tasks of events on them,
+    other than the user behind the event.
+
+    `events` is a list of `(task_id, actor_id, author_message,
+    watcher_message)` tuples. The task's author gets `author_message`,
+    even if they've stopped watching it, and its other watchers
+    `watcher_message`. The author gets one notification either way.
+    """
+
+    if not events:
+        return
+
+    quote = connection.ops.quote_name
+    notification = quote(Notification._meta.db_table)
+    watcher = quote(TaskWatcher._meta.db_table)
+    task = quote(Task._meta.db_table)
+
+    task_field = Notification._meta.get_field("task")
+    now = Notification._meta.get_field("datetime_created") \
+        .get_db_prep_save(timezone.now(), connection)
+
+    rows = [
+        [
+            task_field.get_db_prep_save(task_id, connection),
+            actor_id,
+            author_message,
+            watcher_message,
+            Notification.Type.TASK,
+            str(task_id),
+            now,
+            False,
+            task_field.get_db_prep_save(task_id, connection),
+            task_field.get_db_prep_save(task_id, connection),
+            task_field.get_db_prep_save(task_id, connection),
+            actor_id,
+        ]
+        for task_id, actor_id, author_message, watcher_message in events
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO " + notification + " (receiver_id, task_id, actor_id, "
+                "message, type, location, datetime_created, is_read, event_count) "
+            "SELECT receivers.user_id, %s, %s, "
+                "CASE WHEN tasks.author_id = receivers.user_id THEN %s ELSE %s END, "
+                "%s, %s, %s, %s, 1 "
+            # UNION drops the author's row if they're also watching
+            "FROM (SELECT user_id FROM " + watcher + " WHERE task_id = %s "
+                "UNION SELECT author_id FROM " + task + " WHERE uuid = %s) AS receivers "
+            "INNER JOIN " + task + " AS tasks ON tasks.uuid = %s "
+            "WHERE receivers.user_id <> %s "
+            "ON CONFLICT (receiver_id, task_id) WHERE NOT is_read DO UPDATE SET "
+                "event_count = " + notification + ".event_count + 1, "
+                "actor_id = excluded.actor_id, "
+                "message = excluded.message, "
+                "datetime_created = excluded.datetime_created",
+            rows,
+        )
+
+
+def watch(pairs):
+    """Makes users watch tasks, given `(task_id, user_id)` pairs. Pairs
+    that are already watching are left alone."""
+
+    TaskWatcher.objects.bulk_create(
+        [TaskWatcher(task_id=task_id, user_id=user_id) for task_id, user_id in set(pairs)],
+        ignore_conflicts=True,
+    )
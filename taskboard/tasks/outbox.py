@@ -0,0 +1,277 @@
+"""Transactional outbox for the side effects of saving comments and tasks.
+
+Notifying a task's watchers and recording activity used to happen in
+the signal handlers, inside the request that saved the comment or task.
+Instead, the handlers `enqueue` an OutboxEvent, in the same transaction
+as the save, and the run_taskboard_worker command carries the events out
+in the background. An event is only written if the save commits, and
+is only deleted once its work has committed.
+
+Workers `claim` a batch of events by giving them a lease token and
+pushing their `available_at` back. A worker that dies leaves its events
+to be claimed again once the lease runs out, so an event can be carried
+out more than once, but is never lost. Failed events are retried with
+backoff, up to `MAX_ATTEMPTS` times.
+
+The outbox is only used when the `TASKBOARD_OUTBOX_SYNC` setting is off.
+It's on by default, in which case events are carried out as soon as
+they're enqueued, like before, so that deployments without a worker
+still get their notifications and activity. Turn it off only when the
+worker is running.
+"""
+
+import datetime
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import insert_rows
+from .cache import invalidate
+from .models import Activity, Comment, OutboxEvent, Task
+from .notifications import notify_watchers
+from users.models import TaskboardUser
+
+
+BATCH_SIZE = 100
+"""Events claimed by a worker at a time."""
+
+LEASE = datetime.timedelta(seconds=60)
+"""How long a worker holds the events it claims."""
+
+MAX_ATTEMPTS = 10
+"""Failed attempts after which an event is left alone. It stays in the
+table, with its last error, to be looked into."""
+
+
+def get_backoff(attempts):
+    """Returns how long to wait before retrying an event that has failed
+    `attempts` times: 2, 4, 8... seconds, up to an hour."""
+
+    return datetime.timedelta(seconds=min(2 ** attempts, 3600))
+
+
+def enqueue(type, payload):
+    """Adds an event to the outbox, or carries it out straight away when
+    `TASKBOARD_OUTBOX_SYNC` is on. Payload values have to be JSON
+    serializable."""
+
+    if settings.TASKBOARD_OUTBOX_SYNC:
+        HANDLERS[type]([payload])
+        return
+
+    OutboxEvent.objects.create(type=type, payload=payload)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Claims up to `batch_size` of the oldest events that are due, and
+    returns them.
+
+    The claim is a single UPDATE, conditional on the events still being
+    due, so two workers can't both claim an event: whichever updates it
+    second no longer matches it."""
+
+    now = timezone.now()
+    token = uuid.uuid4().hex
+
+    ids = list(
+        OutboxEvent.objects.filter(available_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by("available_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    OutboxEvent.objects.filter(id__in=ids, available_at__lte=now) \
+        .update(lease=token, available_at=now + LEASE)
+
+    return list(OutboxEvent.objects.filter(id__in=ids, lease=token).order_by("id"))
+
+
+def run(events):
+    """Carries out a list of events, a handler call per type, and
+    deletes them, all in one transaction."""
+
+    payloads = defaultdict(list)
+    for event in events:
+        payload = dict(event.payload)
+        payload.setdefault("at", event.datetime_created.isoformat())
+        payloads[event.type].append(payload)
+
+    with transaction.atomic():
+        for type, items in payloads.items():
+            HANDLERS[type](items)
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+
+
+def process(events):
+    """Carries out claimed events. Returns the number that failed.
+
+    The batch is tried as a whole first. If that fails, each event is
+    tried on its own, so that one bad event doesn't hold the rest back,
+    and the ones that still fail are rescheduled."""
+
+    if not events:
+        return 0
+
+    try:
+        run(events)
+        return 0
+    except Exception:
+        pass
+
+    failed = 0
+    for event in events:
+        try:
+            run([event])
+        except Exception as error:
+            failed += 1
+            event.attempts += 1
+            OutboxEvent.objects.filter(id=event.id).update(
+                attempts=event.attempts,
+                available_at=timezone.now() + get_backoff(event.attempts),
+                lease="",
+                last_error=repr(error),
+            )
+
+    return failed
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Carries out every event that's due, a batch at a time, and
+    returns how many were handled."""
+
+    handled = 0
+    while True:
+        events = claim(batch_size)
+        if not events:
+            return handled
+        process(events)
+        handled += len(events)
+
+
+def get_datetime(payload):
+    """Returns when the event in a payload happened: its `at` value if it
+    has one, or else when it was queued. Events carried out straight away
+    without a time happened now."""
+
+    if "at" not in payload:
+        return timezone.now()
+    return parse_datetime(payload["at"])
+
+
+def handle_new_comments(payloads):
+    """Notifies the watchers of the commented tasks, and adds the
+    posters' activity. Comments deleted since are skipped."""
+
+    comments = Comment.objects.filter(id__in=[payload["comment"] for payload in payloads]) \
+        .select_related("poster", "task") \
+        .only("task_id", "poster__username", "task__summary")
+    comments = {comment.id: comment for comment in comments}
+
+    events = []
+    activity = []
+    for payload in payloads:
+        comment = comments.get(payload["comment"])
+        if comment is None:
+            continue
+
+        poster = comment.poster.username
+        summary = comment.task.summary
+        events.append((
+            comment.task_id,
+            comment.poster_id,
+            str(poster) + " has posted a comment on your task: " + str(summary),
+            str(poster) + " has posted a comment on a task you're watching: " + str(summary),
+        ))
+        activity.append(Activity(
+            user_id=comment.poster_id,
+            type=Activity.Type.NEW_COMMENT,
+            task_id=comment.task_id,
+            datetime_created=get_datetime(payload),
+        ))
+
+    # added to each watcher's unread notification for the task, if
+    # there is one
+    notify_watchers(events)
+    insert_rows(Activity, activity)
+    invalidate("activity")
+
+
+def handle_new_tasks(payloads):
+    """Adds the authors' activity for new tasks. Tasks deleted since are
+    skipped."""
+
+    existing = set(
+        Task.objects.filter(uuid__in=[payload["task"] for payload in payloads])
+            .order_by().values_list("uuid", flat=True)
+    )
+
+    insert_rows(Activity, [
+        Activity(
+            user_id=payload["author"],
+            type=Activity.Type.NEW_TASK,
+            task_id=uuid.UUID(payload["task"]),
+            datetime_created=get_datetime(payload),
+        )
+        for payload in payloads
+        if uuid.UUID(payload["task"]) in existing
+    ])
+    invalidate("activity")
+
+
+def handle_status_changes(payloads):
+    """Notifies the author and watchers of tasks whose status was changed
+    by saving them, and adds the activity of who changed it. Tasks
+    deleted since are skipped.
+
+    Status changes made through the transition action don't come here,
+    since it updates the tasks in bulk and does this itself."""
+
+    tasks = Task.objects.filter(uuid__in=[payload["task"] for payload in payloads]) \
+        .only("uuid", "summary")
+    tasks = {task.uuid: task for task in tasks}
+    actors = dict(
+        TaskboardUser.objects.filter(id__in=[payload["actor"] for payload in payloads])
+            .values_list("id", "username")
+    )
+
+    events = []
+    activity = []
+    for payload in payloads:
+        task = tasks.get(uuid.UUID(payload["task"]))
+        if task is None:
+            continue
+
+        actor = actors.get(payload["actor"])
+        label = Task.Status(payload["status"]).label
+        events.append((
+            task.uuid,
+            payload["actor"],
+            str(actor) + " has changed the status of your task: " + \
+                str(task.summary) + " to " + str(label),
+            str(actor) + " has changed the status of a task you're watching: " + \
+                str(task.summary) + " to " + str(label),
+        ))
+        activity.append(Activity(
+            user_id=payload["actor"],
+            type=Activity.Type.TASK_STATUS_CHANGE,
+            task_id=task.uuid,
+            datetime_created=get_datetime(payload),
+        ))
+
+    notify_watchers(events)
+    insert_rows(Activity, activity)
+    invalidate("activity")
+
+
+HANDLERS = {
+    OutboxEvent.Type.NEW_COMMENT: handle_new_comments,
+    OutboxEvent.Type.NEW_TASK: handle_new_tasks,
+    OutboxEvent.Type.STATUS_CHANGE: handle_status_changes,
+}
+"""The function carrying out each type of event, given a list of their
+payloads."""
@@ -0,0 +1,242 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a unique, composite sort key.
+
+    DRF's own CursorPagination positions itself on the first ordering
+    field only and uses an offset to step over ties, which degrades
+    when lots of rows share a timestamp. Instead, the cursor here holds
+    the full key of the boundary row (e.g. `(datetime_created, uuid)`),
+    and the next page is fetched with a plain range condition on that
+    key. As long as there's an index on the ordering fields, every page
+    costs the same no matter how deep into the list it is, and nothing
+    ever runs a `COUNT(*)`.
+
+    The last ordering field has to be unique, or rows that share a key
+    can be skipped.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    """Default number of items in a page."""
+
+    page_size_query_param = "page_size"
+    """Query parameter the client can use to change the page size."""
+
+    max_page_size = 100
+    """Upper bound of a page size requested by the client."""
+
+    cursor_query_param = "cursor"
+    """Query parameter holding the opaque cursor."""
+
+    invalid_cursor_message = "Invalid cursor."
+
+    ordering = ("-pk",)
+    """Fields that make up the sort key, using the same syntax as
+    `QuerySet.order_by`."""
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Returns the requested page of the queryset as a list."""
+
+        self.read_request(request)
+
+        ordering = self.get_query_ordering()
+
+        if self.position is not None:
+            position = self.to_python(queryset.model, self.position)
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        return self.paginate_rows(rows)
+
+    def read_request(self, request):
+        """Reads the page size and the cursor from the request.
+
+        Called by `paginate_queryset`. Views that fetch their rows some
+        other way (e.g. raw SQL) call this first, then fetch
+        `page_size + 1` rows after `position` in the direction given by
+        `reverse`, and pass them to `paginate_rows`.
+        """
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+    def paginate_rows(self, rows):
+        """Trims a list of rows fetched in query order into a page.
+
+        `rows` should hold up to `page_size + 1` items, so that the
+        extra item can tell if there's anything past this page.
+        """
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        """Returns the page size, taking the client's request into
+        account."""
+
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self.get_position(self.page[-1])
+        return self.encode_cursor(position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self.get_position(self.page[0])
+        return self.encode_cursor(position, reverse=True)
+
+    def get_query_ordering(self):
+        """Returns the ordering used for the query. Previous pages are
+        fetched by walking the sort key backwards."""
+
+        if not self.reverse:
+            return self.ordering
+
+        return tuple(
+            field[1:] if field.startswith("-") else "-" + field
+            for field in self.ordering
+        )
+
+    def get_keyset_filter(self, ordering, position):
+        """Builds the condition for rows that come after `position`.
+
+        For an ordering of `(-a, -b)`, this is
+        `a <= x AND (a < x OR (a = x AND b < y))`. The leading bound is
+        redundant, but it lets SQLite turn the first column into an
+        index range instead of scanning.
+        """
+
+        condition = Q()
+        equal = {}
+
+        for field, value in zip(ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{name + "__" + lookup: value})
+            equal[name] = value
+
+        first = ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+
+        return Q(**{first.lstrip("-") + "__" + bound: position[0]}) & condition
+
+    def get_position(self, item):
+        """Returns the sort key of an item."""
+
+        return [getattr(item, field.lstrip("-")) for field in self.ordering]
+
+    def to_python(self, model, position):
+        """Converts the values of a decoded cursor back into the types
+        of the model fields they came from."""
+
+        try:
+            return [
+                model._meta.get_field(self.get_field_name(model, field)).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_field_name(self, model, field):
+        name = field.lstrip("-")
+        return model._meta.pk.name if name == "pk" else name
+
+    def encode_cursor(self, position, reverse):
+        """Returns the url for a page starting after `position`."""
+
+        payload = {"p": [self.encode_value(value) for value in position]}
+        if reverse:
+            payload["r"] = 1
+
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        ).decode("ascii")
+
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def encode_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (UUID, Decimal)):
+            return str(value)
+        return value
+
+    def decode_cursor(self, request):
+        """Returns the position and direction stored in the cursor
+        query parameter, or `(None, False)` for the first page."""
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position = payload["p"]
+            reverse = bool(payload.get("r", False))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
@@ -0,0 +1,245 @@
+"""Full-text search over tasks and comments.
+
+Search is backed by an SQLite FTS5 table, `tasks_search`, created in
+migration 0030. Every task and every comment has one row in it:
+
+- task rows fill in the summary and description columns,
+- comment rows fill in the content column.
+
+Both kinds of row store the UUID of the task they belong to, so a hit
+on a comment can link back to its task.
+
+FTS5 tables are keyed on an integer rowid, but tasks use UUIDs. Task
+rows therefore take the low 63 bits of the UUID as their rowid, which
+keeps them positive. Comment rows use the negated comment id. The two
+ranges can't overlap, and a single row can be updated or deleted by
+rowid without scanning the table.
+
+The index is kept up to date by the signal handlers in signals.py.
+Anything that writes tasks or comments without sending signals (e.g.
+bulk_create) has to call the `index_*` functions itself.
+"""
+
+import html
+import re
+from collections import namedtuple
+from uuid import UUID
+
+from django.db import connection
+
+from .models import Comment, Task
+
+
+TABLE = "tasks_search"
+
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+"""Markers placed around matched terms by FTS5. They are swapped out
+for `<mark>` tags once the rest of the snippet has been escaped."""
+
+SNIPPET_TOKENS = 16
+"""Maximum number of tokens in a snippet."""
+
+COLUMN_WEIGHTS = (0.0, 10.0, 4.0, 1.0)
+"""bm25 weights for the task_uuid, summary, description and content
+columns. A hit in a summary counts for more than one in a comment."""
+
+SearchHit = namedtuple(
+    "SearchHit",
+    ("rowid", "task_uuid", "score", "snippet", "summary", "type"),
+)
+"""A search result. A lower score is a better match."""
+
+
+def as_hex(uuid):
+    """Returns a UUID in the format Django stores it in on SQLite."""
+
+    return uuid.hex if isinstance(uuid, UUID) else UUID(str(uuid)).hex
+
+
+def task_rowid(uuid):
+    """Returns the rowid of a task's row in the search table."""
+
+    uuid = uuid if isinstance(uuid, UUID) else UUID(str(uuid))
+    return uuid.int & 0x7FFFFFFFFFFFFFFF
+
+
+def comment_rowid(pk):
+    """Returns the rowid of a comment's row in the search table."""
+
+    return -pk
+
+
+def index_tasks(tasks):
+    """Adds or replaces the search rows of a list of tasks."""
+
+    rows = [
+        (task_rowid(task.uuid), as_hex(task.uuid), task.summary or "", task.description or "")
+        for task in tasks
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO " + TABLE + " "
+            "(rowid, task_uuid, summary, description, content) "
+            "VALUES (%s, %s, %s, %s, '')",
+            rows,
+        )
+
+
+def index_comments(comments):
+    """Adds or replaces the search rows of a list of comments."""
+
+    rows = [
+        (comment_rowid(comment.pk), as_hex(comment.task_id), comment.content or "")
+        for comment in comments
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO " + TABLE + " "
+            "(rowid, task_uuid, summary, description, content) "
+            "VALUES (%s, %s, '', '', %s)",
+            rows,
+        )
+
+
+def index_task_comments(uuids):
+    """Adds or replaces the search rows of every comment on a list of
+    tasks.
+
+    The rows are copied straight from the comment table, so this works
+    for comments inserted without their ids being read back."""
+
+    uuids = [as_hex(uuid) for uuid in uuids]
+
+    with connection.cursor() as cursor:
+        # in chunks, to stay under SQLite's limit on query parameters
+        for start in range(0, len(uuids), 500):
+            chunk = uuids[start:start + 500]
+            cursor.execute(
+                "INSERT OR REPLACE INTO " + TABLE + " "
+                "(rowid, task_uuid, summary, description, content) "
+                "SELECT -id, task_id, '', '', content FROM tasks_comment "
+                "WHERE task_id IN (" + ", ".join(["%s"] * len(chunk)) + ")",
+                chunk,
+            )
+
+
+def index_task(task):
+    index_tasks([task])
+
+
+def index_comment(comment):
+    index_comments([comment])
+
+
+def unindex_task(uuid):
+    """Removes a task's row from the search table. Its comments are
+    removed separately, as they are deleted."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM " + TABLE + " WHERE rowid = %s", [task_rowid(uuid)])
+
+
+def unindex_comment(pk):
+    """Removes a comment's row from the search table."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM " + TABLE + " WHERE rowid = %s", [comment_rowid(pk)])
+
+
+def rebuild_index(chunk_size=2000):
+    """Empties the search table, then indexes every task and comment
+    again."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM " + TABLE)
+
+    tasks = Task.objects.only("uuid", "summary", "description").order_by()
+    comments = Comment.objects.only("id", "task_id", "content").order_by()
+
+    for index, queryset in ((index_tasks, tasks), (index_comments, comments)):
+        batch = []
+        for item in queryset.iterator(chunk_size=chunk_size):
+            batch.append(item)
+            if len(batch) >= chunk_size:
+                index(batch)
+                batch = []
+        index(batch)
+
+
+def build_match_query(query):
+    """Turns user input into an FTS5 query.
+
+    Every word is quoted so that characters with a meaning in the FTS5
+    query syntax are taken literally, and all words have to match. The
+    last word is matched as a prefix, since it may still be being
+    typed. Returns an empty string if there are no words to search for.
+    """
+
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+
+    terms = ['"' + word + '"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(query, position=None, reverse=False, limit=10):
+    """Returns up to `limit` hits for a query, best matches first.
+
+    `position` is the `(score, rowid)` of the last hit on the previous
+    page, if any. When `reverse` is true, hits are fetched backwards
+    from `position`, worst match first, for paging back.
+    """
+
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+    direction = "DESC" if reverse else "ASC"
+
+    sql = (
+        "SELECT hits.rowid, hits.task_uuid, hits.score, hits.snippet, "
+        "tasks_task.summary, tasks_task.type "
+        "FROM ("
+            "SELECT rowid AS rowid, task_uuid, "
+            "bm25(" + TABLE + ", " + weights + ") AS score, "
+            "snippet(" + TABLE + ", -1, %s, %s, '...', %s) AS snippet "
+            "FROM " + TABLE + " WHERE " + TABLE + " MATCH %s"
+        ") AS hits "
+        "INNER JOIN tasks_task ON tasks_task.uuid = hits.task_uuid "
+    )
+    params = [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, match]
+
+    if position is not None:
+        operator = "<" if reverse else ">"
+        sql += (
+            "WHERE hits.score " + operator + " %s "
+            "OR (hits.score = %s AND hits.rowid " + operator + " %s) "
+        )
+        params += [position[0], position[0], position[1]]
+
+    sql += "ORDER BY hits.score " + direction + ", hits.rowid " + direction + " LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        SearchHit(rowid, UUID(task_uuid), score, highlight(snippet), summary, type)
+        for rowid, task_uuid, score, snippet, summary, type in rows
+    ]
+
+
+def highlight(snippet):
+    """Escapes a snippet for HTML, then wraps matched terms in `<mark>`
+    tags."""
+
+    return html.escape(snippet) \
+        .replace(HIGHLIGHT_START, "<mark>") \
+        .replace(HIGHLIGHT_END, "</mark>")
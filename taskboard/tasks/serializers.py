@@ -1,20 +1,27 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from .models import Task, Project, Comment, Notification, Activity
-from users.models import TaskboardUser
+from taskboard.timing import TimedListSerializer, TimedSerializerMixin
+from .cache import invalidate
+from . import search
+from .notifications import watch
 
-class TaskOverviewSerializer(serializers.ModelSerializer):
+class TaskOverviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Returns the UUID and Summary of a task.
     
     Intended to be used when returning a list of tasks, rather than
     returning all the data.
     """
     class Meta:
+        list_serializer_class = TimedListSerializer
         model = Task
         fields = (
             "uuid",
             "summary",
             "type",
+            "comment_count",
+            "last_activity_at",
         )
 
     def to_representation(self, instance):
@@ -22,7 +29,7 @@ class TaskOverviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Returns details of a comment.
     
     Due to the simplicity of the Comment model, there is no divide
@@ -30,17 +37,20 @@ class CommentSerializer(serializers.ModelSerializer):
     fields."""
     
     class Meta:
+        list_serializer_class = TimedListSerializer
         model = Comment
         fields = ("content", "date_created", "poster")
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        # replace foreign keys with string representation
+        # replace foreign keys with string representation. the poster
+        # should be loaded with select_related, or this is a query per
+        # comment
 
-        poster_pk = data.pop("poster")
+        data.pop("poster")
 
-        user = TaskboardUser.objects.get(pk=poster_pk)
+        user = instance.poster
 
         data.update({
             "poster": user.username,
@@ -57,19 +67,25 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def create(self, validated_data):
-        """Creates a new comment."""
-        
-        return Comment.objects.create(**validated_data)
+        """Creates a new comment. The signal handlers' writes, including
+        its outbox event, are in the same transaction."""
+
+        with transaction.atomic():
+            return Comment.objects.create(**validated_data)
 
-class TaskDetailsSerializer(serializers.ModelSerializer):
+class TaskDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Returns the full information regarding a task.
     
     Author and Project foreign keys are replaced with their string
     representations. Type and Status enums are replaced with their
     display strings. Comments are given as an array.
+
+    By default every comment is included. The view can instead pass a
+    subset of them in the `comments` context key, along with the total
+    in `comment_count`.
     """
 
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
     
     class Meta:
         model = Task
@@ -85,26 +101,31 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
             "comments",
         )
 
+    def get_comments(self, instance):
+        comments = self.context.get("comments")
+        if comments is None:
+            comments = instance.comments.all()
+        return CommentSerializer(comments, many=True).data
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        # replace foreign keys with string representation
+        # replace foreign keys with string representation. author and
+        # project are expected to come from select_related
 
-        author_pk = data.pop("author")
-        project_pk = data.pop("project")
+        data.pop("author")
+        data.pop("project")
 
-        user = TaskboardUser.objects.get(pk=author_pk)
+        user = instance.author
         data.update({
             "author": user.username,
             "author_name": user.name or user.username,
         })
 
-        # TODO: replace this with something that doesn't require a try/catch
-        #       not sure how efficient try/catch is in Python but it can't be good lol
-        try:
-            project_name = "None" if instance.get_type_display() == "Project" else Project.objects.get(pk=project_pk).name
-        except Exception:
+        if instance.type == Task.Type.PROJECT or instance.project is None:
             project_name = "None"
+        else:
+            project_name = instance.project.name
 
         data.update({"project": project_name})
 
@@ -115,23 +136,102 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
         data.update({"type": instance.get_type_display()})
         data.update({"status": instance.get_status_display()})
 
+        if "comment_count" in self.context:
+            data.update({"comment_count": self.context["comment_count"]})
+
         return data
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = "__all__"
+        read_only_fields = ("comment_count", "last_activity_at")
 
     def create(self, validated_data):
         """
         Create and return a new Task instance, given the validated data.
-        """ 
-        return Task.objects.create(**validated_data)
+        The signal handlers' writes are in the same transaction.
+        """
+        with transaction.atomic():
+            return Task.objects.create(**validated_data)
+
+    def validate(self, attrs):
+        # projects can't be in projects. the pre_save handler does the
+        # same for tasks saved without a serializer, but bulk_create
+        # skips it
+        if attrs.get("type") == Task.Type.PROJECT:
+            attrs["project"] = None
+        return attrs
+
+class TaskBulkCreateListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """Creates every task in one transaction, with bulk_create.
+
+        bulk_create doesn't send signals, so the activity, search index,
+        watcher and cache updates made by the task signal handlers are
+        done here, for all of the tasks at once."""
+
+        tasks = [Task(**attrs) for attrs in validated_data]
+
+        with transaction.atomic():
+            Task.objects.bulk_create(tasks)
+            Activity.objects.bulk_create([
+                Activity(
+                    user_id=task.author_id,
+                    type=Activity.Type.NEW_TASK,
+                    task=task,
+                )
+                for task in tasks
+            ])
+            search.index_tasks(tasks)
+            watch([(task.uuid, task.author_id) for task in tasks])
+
+        invalidate("tasks", "activity")
+
+        return tasks
+
+class TaskBulkCreateSerializer(TaskCreateSerializer):
+    """Serializer for creating many tasks at once.
+
+    Projects are given by name, and looked up in the `projects` context
+    key, a dict of names to projects, so that the view can fetch every
+    project in one query rather than one per task. The author is passed
+    to `save()`.
+    """
 
-class ProjectOverviewSerializer(serializers.ModelSerializer):
+    project = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        allow_null=True,
+    )
+
+    class Meta(TaskCreateSerializer.Meta):
+        list_serializer_class = TaskBulkCreateListSerializer
+        read_only_fields = TaskCreateSerializer.Meta.read_only_fields + ("author",)
+
+    def validate_project(self, value):
+        if value is None or str(value) == "":
+            return None
+
+        try:
+            return self.context["projects"][value]
+        except KeyError:
+            raise serializers.ValidationError(
+                "Could not find project with a name of " + str(value) + "."
+            )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update({
+            "project": instance.project.name if instance.project is not None else None,
+        })
+        return data
+
+class ProjectOverviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Returns project names."""
 
     class Meta:
+        list_serializer_class = TimedListSerializer
         model = Project
         fields = ("name", )
 
@@ -139,7 +239,7 @@ class ProjectOverviewSerializer(serializers.ModelSerializer):
         data = super().to_representation(instance)
         return data
     
-class ProjectDetailsSerializer(serializers.ModelSerializer):
+class ProjectDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Returns all fields of a project model."""
 
     class Meta:
@@ -151,28 +251,47 @@ class ProjectDetailsSerializer(serializers.ModelSerializer):
         data.update({"type": instance.get_type_display()})
         return data
     
-class NotificationDetailsSerializer(serializers.ModelSerializer):
+class NotificationDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for viewing notifications."""
 
     class Meta:
+        list_serializer_class = TimedListSerializer
         model = Notification
-        fields = ("message", "datetime_created", "type", "location")
+        fields = (
+            "id",
+            "message",
+            "datetime_created",
+            "type",
+            "location",
+            "is_read",
+            "event_count",
+            "actor",
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+
+        # the actor should be loaded with select_related, or this is a
+        # query per notification
+        actor = instance.actor
+        data.update({"actor": actor.username if actor is not None else None})
+
+        return data
 
-class ActivityDetailsSerializer(serializers.ModelSerializer):
+class ActivityDetailsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for viewing user activity."""
 
     class Meta:
+        list_serializer_class = TimedListSerializer
         model = Activity
         fields = "__all__"
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
 
-        user_pk = data.pop("user")
-
-        data.update({
-            "user": TaskboardUser.objects.get(pk=user_pk).username}
-        )
+        # the user should be loaded with select_related, or this is a
+        # query per activity
+        data.update({"user": instance.user.username})
 
         data.update({"type": instance.get_type_display()})
 
@@ -1,61 +1,178 @@
-from django.db.models.signals import post_save
-from django.db import transaction
+from django.db.models.signals import pre_save, post_init, post_save, post_delete
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.dispatch import receiver
+from django.utils import timezone
 
-from functools import partial
-
-from .models import Comment, Notification, Task, Activity
+from .models import Comment, Task, Activity, OutboxEvent, Project
+from .cache import invalidate
+from .notifications import watch
+from .outbox import enqueue
+from . import search
+from users.models import TaskboardUser
 
 
 @receiver(post_save, sender=Comment)
-def comment_post_save_handler(sender, instance, **kwargs):
-    """Creates a new Notification model whenever a comment is posted on
-    a task."""
-
-    comment_poster = instance.poster.username
-    notification_receiver = instance.task.author
-    task_summary = instance.task.summary
-
-    message = str(comment_poster) + \
-            " has posted a comment on your task: " + \
-            str(task_summary)
-    
-    Notification.objects.create(
-        receiver=notification_receiver,
-        message=message
-    )
+def comment_post_save_handler(sender, instance, created, **kwargs):
+    """Indexes a saved comment for search, and moves its task's
+    `related_changed_at`. A new comment also makes its poster watch its
+    task, updates the task's comment count and activity time, and queues
+    up notifying the task's watchers."""
 
-    Activity.objects.create(
-        user=instance.poster,
-        type=Activity.Type.NEW_COMMENT,
-        task=instance.task,
-    )
+    if created:
+        # F() so that comments posted at the same time don't overwrite
+        # each others' counts
+        Task.objects.filter(pk=instance.task_id).update(
+            comment_count=F("comment_count") + 1,
+            last_activity_at=instance.date_created,
+            related_changed_at=timezone.now(),
+        )
+        invalidate("tasks")
 
-@receiver(post_save, sender=Task)
-def task_post_save_handler(sender, instance, *args, **kwargs):
-    """Handles the validation of Tasks when they are saved."""
-    
-    # TODO: prevent duplicate activity on refixing task instance
-    Activity.objects.create(
-        user=instance.author,
-        type=Activity.Type.NEW_TASK,
-        task=instance,
+        watch([(instance.task_id, instance.poster_id)])
+
+        # the watchers are notified, and the activity added, by the
+        # outbox worker
+        enqueue(OutboxEvent.Type.NEW_COMMENT, {
+            "comment": instance.pk,
+            "task": str(instance.task_id),
+            "poster": instance.poster_id,
+            "at": instance.date_created.isoformat(),
+        })
+    else:
+        Task.objects.filter(pk=instance.task_id).update(related_changed_at=timezone.now())
+
+    search.index_comment(instance)
+
+@receiver(post_delete, sender=Comment)
+def comment_post_delete_handler(sender, instance, **kwargs):
+    """Removes a deleted comment from the search index, takes it off its
+    task's comment count, and moves the task's activity time back to its
+    latest remaining comment, or to when it was created."""
+
+    search.unindex_comment(instance.pk)
+
+    # the newest comment left, read from the (task, date_created) index
+    # in the same UPDATE
+    latest = Comment.objects.filter(task=OuterRef("pk")) \
+        .order_by("-date_created").values("date_created")[:1]
+
+    # Greatest() in case the count was never backfilled
+    Task.objects.filter(pk=instance.task_id).update(
+        comment_count=Greatest(F("comment_count") - 1, 0),
+        last_activity_at=Coalesce(Subquery(latest), F("datetime_created")),
+        related_changed_at=timezone.now(),
     )
+    invalidate("tasks")
+
+@receiver(pre_save, sender=Task)
+def task_pre_save_handler(sender, instance, **kwargs):
+    """Clears the project of tasks of type PROJECT before they're saved,
+    since projects can't be in projects.
 
-    # need this if statement or else it'll endlessly recurse
-    if instance.type == instance.Type.PROJECT and instance.project != None:
-        transaction.on_commit(partial(
-            validate_task_instance,
-            sender=sender,
-            instance=instance,
-        ))
-
-# https://docs.djangoproject.com/en/5.0/topics/db/transactions/#performing-actions-after-commit
-def validate_task_instance(sender, instance, *args, **kwargs):
-    if instance.type == instance.Type.PROJECT and instance.project != None:
-        print("\r\nAttempting to save Task model instance with type as " \
-                "Type.PROJECT, but project field is set as not null. The " \
-                "project field will be automatically set to null.\r\n"
-                )
+    This used to be done by saving the task a second time once the first
+    save had committed, which ran a second UPDATE and added a second
+    activity."""
+
+    if instance.type == Task.Type.PROJECT:
         instance.project = None
-    super(Task, instance).save(*args, **kwargs)
\ No newline at end of file
+
+@receiver(post_init, sender=Task)
+def task_post_init_handler(sender, instance, **kwargs):
+    """Remembers the status a task was loaded with, so that a status
+    change can be told apart from other saves without querying. A
+    deferred status is left as None rather than loaded."""
+
+    instance._saved_status = instance.__dict__.get("status")
+
+@receiver(post_save, sender=Task)
+def task_post_save_handler(sender, instance, created, **kwargs):
+    """Indexes a saved task for search, and drops cached task lists. New
+    tasks are watched by their author, and queue up their activity.
+
+    A save that changes a task's status, e.g. from the admin, queues up
+    notifying its author and watchers and the status change activity.
+    It's put down to the task's `changed_by` user if it has been given
+    one, and to its author otherwise."""
+
+    status = instance.__dict__.get("status")
+    changed = not created and None not in (status, instance._saved_status) and \
+        status != instance._saved_status
+    instance._saved_status = status
+
+    if created:
+        enqueue(OutboxEvent.Type.NEW_TASK, {
+            "task": str(instance.uuid),
+            "author": instance.author_id,
+            "at": instance.datetime_created.isoformat(),
+        })
+        watch([(instance.uuid, instance.author_id)])
+    elif changed:
+        actor = getattr(instance, "changed_by", None)
+        enqueue(OutboxEvent.Type.STATUS_CHANGE, {
+            "task": str(instance.uuid),
+            "actor": actor.id if actor is not None else instance.author_id,
+            "status": status,
+            "at": timezone.now().isoformat(),
+        })
+
+    search.index_task(instance)
+    invalidate("tasks")
+
+@receiver(post_delete, sender=Task)
+def task_post_delete_handler(sender, instance, **kwargs):
+    """Removes a deleted task from the search index and drops cached
+    task lists. Its comments are removed from the index by their own
+    handler, as they're deleted along with it."""
+
+    search.unindex_task(instance.uuid)
+    invalidate("tasks")
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_change_handler(sender, instance, **kwargs):
+    """Drops cached project lists, and cached task lists since those can
+    be filtered by project name."""
+
+    invalidate("projects", "tasks")
+
+@receiver(post_save, sender=Project)
+def project_post_save_handler(sender, instance, created, **kwargs):
+    """Moves `related_changed_at` on the project's tasks, since their
+    details show its name."""
+
+    if not created:
+        Task.objects.filter(project=instance).update(related_changed_at=timezone.now())
+
+@receiver(post_init, sender=TaskboardUser)
+def user_post_init_handler(sender, instance, **kwargs):
+    """Remembers the names a user was loaded with, so that a rename can
+    be told apart from other saves without querying. Deferred fields are
+    left as None rather than loaded."""
+
+    instance._saved_names = (instance.__dict__.get("username"), instance.__dict__.get("name"))
+
+@receiver(post_save, sender=TaskboardUser)
+def user_post_save_handler(sender, instance, created, **kwargs):
+    """Moves `related_changed_at` on the tasks a renamed user wrote or
+    commented on, since their details show the user's names. A single
+    UPDATE, however many tasks there are."""
+
+    names = (instance.__dict__.get("username"), instance.__dict__.get("name"))
+    changed = not created and names != instance._saved_names
+    instance._saved_names = names
+
+    if not changed:
+        return
+
+    commented = Comment.objects.filter(poster=instance).values("task_id")
+    Task.objects.filter(Q(author=instance) | Q(uuid__in=commented)) \
+        .update(related_changed_at=timezone.now())
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def activity_change_handler(sender, instance, **kwargs):
+    """Bumps the activity namespace, so that requests for user activity
+    made after this don't share a response started before it."""
+
+    invalidate("activity")
@@ -0,0 +1,189 @@
+import hashlib
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .cache import get_version, render_response
+from .streaming import wants_stream
+
+
+LOCK_KEY = "taskboard:singleflight:lock:{key}"
+RESULT_KEY = "taskboard:singleflight:result:{key}:{token}"
+
+
+class SingleFlight:
+    """Makes sure that only one call per key runs at a time.
+
+    A call made while another call with the same key is running waits
+    for that call to finish, and gets its result, instead of running
+    the function again.
+
+    Calls are always coalesced between the threads of a process. With
+    `shared` set, the first thread of every process also competes for a
+    lock in the cache, so that (given a file or database cache backend)
+    calls are coalesced between processes too. In that case, results
+    have to be picklable.
+    """
+
+    def __init__(self, shared=False, timeout=10.0, poll_interval=0.01):
+        self.shared = shared
+
+        self.timeout = timeout
+        """Seconds a call waits on another process before running the
+        function itself. Also the lifetime of the shared lock, should
+        the process holding it die."""
+
+        self.poll_interval = poll_interval
+        """Seconds between checks of the cache while waiting on another
+        process."""
+
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Returns the result of `function()`, or of the call with the
+        same key that's already running."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.failed:
+                # the error was raised in the leader's request. rather
+                # than fail every waiting request with it, try again
+                return function()
+            return call.result
+
+        try:
+            if self.shared:
+                call.result = self._do_shared(key, function)
+            else:
+                call.result = function()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def _do_shared(self, key, function):
+        lock_key = LOCK_KEY.format(key=key)
+        token = uuid.uuid4().hex
+
+        if cache.add(lock_key, token, timeout=self.timeout):
+            try:
+                result = function()
+                cache.set(RESULT_KEY.format(key=key, token=token), result, timeout=self.timeout)
+            finally:
+                cache.delete(lock_key)
+            return result
+
+        # another process is running the call. results are stored under
+        # the token of the call that made them, so that a result left
+        # behind by an earlier call is never picked up
+        deadline = time.monotonic() + self.timeout
+
+        while time.monotonic() < deadline:
+            token = cache.get(lock_key)
+            if token is None:
+                break
+
+            time.sleep(self.poll_interval)
+
+            result = cache.get(RESULT_KEY.format(key=key, token=token))
+            if result is not None:
+                return result
+
+        return function()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.failed = False
+        self.result = None
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_flight():
+    """Returns the process wide SingleFlight, set up from the
+    `TASKBOARD_SINGLE_FLIGHT` setting. Returns None when it's off."""
+
+    global _flight
+
+    mode = settings.TASKBOARD_SINGLE_FLIGHT
+    if mode == "off":
+        return None
+
+    with _flight_lock:
+        if _flight is None or _flight.shared != (mode == "shared"):
+            _flight = SingleFlight(shared=(mode == "shared"))
+
+    return _flight
+
+
+def coalesce_response(namespace):
+    """Decorator for GET views, making concurrent identical requests
+    share a single run of the view.
+
+    Requests are identical when they have the same path, query string
+    and response media type. The namespace's cache version is part of
+    the key, so a request made after the data changed (and the
+    namespace was invalidated) never gets a response that was started
+    before the change.
+
+    The shared response is rendered once. Every request then gets its
+    own copy of the status, body and content type; other headers set by
+    the view are not kept.
+
+    Streamed responses (see streaming.py) can only be read once, so
+    they're never shared. Neither is the browsable API, for the same
+    reason it isn't cached: the page belongs to the user who asked.
+
+    Like `cache_response`, this goes under `api_view`, or on a ViewSet
+    method through `method_decorator`. When both are used,
+    `cache_response` goes first, so only cache misses are coalesced.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped_view(request, *args, **kwargs):
+            flight = get_flight()
+            if request.method != "GET" or flight is None or wants_stream(request):
+                return view(request, *args, **kwargs)
+
+            if request.accepted_renderer.format != "json":
+                return view(request, *args, **kwargs)
+
+            digest = hashlib.md5(
+                (request.accepted_media_type + "\n" + request.get_full_path()).encode("utf-8"),
+                usedforsecurity=False,
+            ).hexdigest()
+            key = namespace + ":" + str(get_version(namespace)) + ":" + digest
+
+            def run_view():
+                response = view(request, *args, **kwargs)
+                response = render_response(request, response, *args, **kwargs)
+                return (response.status_code, response.content, response["Content-Type"])
+
+            status, content, content_type = flight.do(key, run_view)
+            return HttpResponse(content, status=status, content_type=content_type)
+
+        return wrapped_view
+
+    return decorator
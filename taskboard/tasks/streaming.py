@@ -0,0 +1,51 @@
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+
+CHUNK_SIZE = 500
+"""Rows fetched from the database, and serialized, at a time."""
+
+
+def wants_stream(request):
+    """Returns whether a request asked for a streamed response, with
+    `?stream=true`."""
+
+    return request.GET.get("stream", "").lower() in ("true", "1")
+
+
+def stream_json(queryset, serializer_class, context=None, chunk_size=CHUNK_SIZE):
+    """Returns a response streaming every row of a queryset as a JSON
+    array.
+
+    Rows are fetched with `.iterator()` and serialized a chunk at a
+    time, so only one chunk is ever held in memory, however many rows
+    there are. `select_related` and `prefetch_related` are applied to
+    each chunk as usual.
+
+    The response is always JSON, whatever renderer the request asked
+    for, and is never cached.
+    """
+
+    renderer = JSONRenderer()
+
+    def generate():
+        rows = queryset.iterator(chunk_size=chunk_size)
+        separator = b"["
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+
+            data = serializer_class(chunk, many=True, context=context or {}).data
+
+            # render the chunk as an array, and drop its brackets so the
+            # chunks join up into one array
+            yield separator + renderer.render(data)[1:-1]
+            separator = b","
+
+        yield b"[]" if separator == b"[" else b"]"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
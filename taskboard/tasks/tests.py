@@ -1,3 +1,1438 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import warnings
+from io import StringIO
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import outbox, search, views
+from .singleflight import SingleFlight
+from .models import Activity, Comment, Notification, OutboxEvent, Project, Task
+from taskboard import metrics, slowqueries
+from users.models import TaskboardUser
+
+
+class QueryCountTests:
+    """Checks the number of queries made by every route.
+
+    The same tests run against databases of different sizes (see the
+    subclasses below), with the same expected counts, so a query that
+    runs once per task, comment, notification or activity fails the
+    larger one.
+
+    The response cache is turned off, so that every request runs its
+    view, and side effects go through the outbox, as they do in
+    deployments with a worker.
+    """
+
+    seed = {}
+    """Options for the seed_taskboard command."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("seed_taskboard", seed=1, stdout=StringIO(), **cls.seed)
+
+        # the busiest rows, so that lists are as long as they get
+        cls.task = Task.objects.order_by("-comment_count").first()
+        cls.user = TaskboardUser.objects.annotate(
+            total=Count("activity", distinct=True) + Count("notifications", distinct=True),
+        ).order_by("-total").first()
+        cls.project = Project.objects.first()
+        cls.comment = Comment.objects.first()
+
+        cls.staff = TaskboardUser.objects.create_user(
+            username="staff", password="staff", is_staff=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(token))
+
+    def assertQueries(self, count, method, path, data=None, status=200):
+        with self.assertNumQueries(count):
+            response = getattr(self.client, method)(path, data, format="json")
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def test_api_root(self):
+        self.assertQueries(0, "get", "/api/")
+
+    def test_tasks_list(self):
+        self.assertQueries(1, "get", "/api/tasks/")
+        self.assertQueries(1, "get", "/api/tasks/?sort=edited&page_size=100")
+        self.assertQueries(1, "get", "/api/tasks/?sort=activity")
+
+        response = self.assertQueries(1, "get", "/api/tasks/?page_size=2")
+        self.assertQueries(1, "get", response.json()["next"])
+
+    def test_tasks_list_filtered(self):
+        path = "/api/tasks/?filter=status:TODO&filter=status:REVW" + \
+            "&filter=project:" + self.project.name + "&filter=author:" + self.user.username
+        self.assertQueries(1, "get", path)
+
+    def test_tasks_search(self):
+        word = self.task.summary.split()[0]
+        self.assertQueries(1, "get", "/api/tasks/search/?q=" + word)
+
+    def test_tasks_detail(self):
+        # the validators, the task with its author and project, and the
+        # comments with their posters
+        self.assertQueries(3, "get", "/api/tasks/" + str(self.task.uuid) + "/")
+        self.assertQueries(3, "get", "/api/tasks/" + str(self.task.uuid) + "/?comments=5")
+
+    def test_tasks_detail_not_modified(self):
+        response = self.client.get("/api/tasks/" + str(self.task.uuid) + "/")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/tasks/" + str(self.task.uuid) + "/",
+                HTTP_IF_NONE_MATCH=response["ETag"],
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_tasks_comments(self):
+        self.assertQueries(2, "get", "/api/tasks/" + str(self.task.uuid) + "/comments/")
+
+    def test_tasks_create(self):
+        # the activity is left to the outbox worker. the transaction is a
+        # savepoint in tests, which adds two queries
+        self.authenticate(self.user)
+        self.assertQueries(10, "post", "/api/tasks/", {
+            "summary": "New task",
+            "description": "Made by a test.",
+            "type": "TASK",
+            "project": self.project.name,
+        }, status=201)
+
+    @override_settings(TASKBOARD_OUTBOX_SYNC=True)
+    def test_tasks_create_project(self):
+        # a project's project is cleared before it's inserted, rather than
+        # by saving it again
+        self.authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/tasks/", {
+                "summary": "New project",
+                "description": "Made by a test.",
+                "type": Task.Type.PROJECT,
+                "project": self.project.name,
+            }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+
+        def count(statement):
+            return len([query for query in queries.captured_queries if statement in query["sql"]])
+
+        self.assertEqual(count('INSERT INTO "tasks_task"'), 1)
+        self.assertEqual(count('INSERT INTO "tasks_activity"'), 1)
+        self.assertEqual(count('UPDATE "tasks_task"'), 0)
+
+        task = Task.objects.get(uuid=response.json()["uuid"])
+        self.assertIsNone(task.project)
+
+        # only creating a task counts as activity
+        task.save()
+        self.assertEqual(task.activity.count(), 1)
+
+    def test_tasks_bulk(self):
+        # the user, the projects, then a transaction inserting the tasks,
+        # their activity, their search rows and their watchers
+        self.authenticate(self.user)
+        response = self.assertQueries(8, "post", "/api/tasks/bulk/", [
+            {
+                "summary": "New task " + str(number),
+                "description": "Made by a test.",
+                "type": "TASK",
+                "project": self.project.name,
+            }
+            for number in range(20)
+        ], status=201)
+        self.assertEqual(len(response.json()), 20)
+
+    def test_tasks_bulk_invalid(self):
+        self.authenticate(self.user)
+        count = Task.objects.count()
+
+        response = self.assertQueries(2, "post", "/api/tasks/bulk/", [
+            {"summary": "Fine", "description": "", "project": self.project.name},
+            {"summary": "Nowhere", "description": "", "project": "no such project"},
+            {"summary": "Odd", "description": "", "type": "ODD"},
+        ], status=400)
+
+        errors = response.json()["errors"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("project", errors[1])
+        self.assertIn("type", errors[2])
+        self.assertEqual(Task.objects.count(), count)
+
+    def test_tasks_transition(self):
+        tasks = Task.objects.exclude(status=Task.Status.COMPLETE)
+        uuids = [str(uuid) for uuid in tasks.values_list("uuid", flat=True)]
+
+        # the staff user, then a transaction finding the tasks, updating
+        # them, and inserting their activity and notifications
+        self.authenticate(self.staff)
+        response = self.assertQueries(7, "post", "/api/tasks/transition/", {
+            "tasks": uuids,
+            "status": Task.Status.COMPLETE,
+        })
+        self.assertEqual(sorted(response.json()["updated"]), sorted(uuids))
+        self.assertFalse(tasks.exists())
+
+        self.authenticate(self.user)
+        self.assertQueries(1, "post", "/api/tasks/transition/", {
+            "tasks": uuids,
+            "status": Task.Status.TODO,
+        }, status=403)
+
+    def test_tasks_transition_invalid(self):
+        self.authenticate(self.staff)
+        for data in (
+            [str(self.task.uuid)],
+            "COMP",
+            {"tasks": [str(self.task.uuid)], "status": "ODD"},
+            {"tasks": str(self.task.uuid), "status": Task.Status.TODO},
+            {"tasks": ["not a uuid"], "status": Task.Status.TODO},
+        ):
+            response = self.assertQueries(1, "post", "/api/tasks/transition/", data, status=400)
+            self.assertIn("details", response.json())
+
+    def test_tasks_review_queue(self):
+        response = self.assertQueries(1, "get", "/api/tasks/review-queue/?page_size=2")
+        if response.json()["next"]:
+            self.assertQueries(1, "get", response.json()["next"])
+
+    def test_tasks_watch(self):
+        path = "/api/tasks/" + str(self.task.uuid) + "/watch/"
+        self.assertQueries(0, "post", path, status=401)
+
+        self.authenticate(self.staff)
+        self.assertQueries(3, "post", path)
+        self.assertQueries(3, "post", path)
+        self.assertTrue(self.task.watchers.filter(user=self.staff).exists())
+
+        # the author and watchers other than the actor are notified, in
+        # one statement however many there are
+        new_status = Task.Status.TODO
+        if self.task.status == new_status:
+            new_status = Task.Status.COMPLETE
+        self.client.post("/api/tasks/transition/", {
+            "tasks": [str(self.task.uuid)],
+            "status": new_status,
+        }, format="json")
+        self.assertEqual(
+            set(self.task.notifications.filter(is_read=False).values_list("receiver", flat=True)),
+            set(self.task.watchers.exclude(user=self.staff).values_list("user", flat=True)) | \
+                {self.task.author_id},
+        )
+
+        self.assertQueries(3, "delete", path)
+        self.assertFalse(self.task.watchers.filter(user=self.staff).exists())
+
+        # only tasks can be watched
+        self.assertQueries(0, "post", "/api/comments/" + str(self.comment.id) + "/watch/", status=404)
+
+    def test_tasks_transition_author(self):
+        # the author is notified even after they've stopped watching,
+        # and only once when they're still watching
+        Task.objects.filter(uuid=self.task.uuid).update(status=Task.Status.REVIEWING)
+        self.task.watchers.filter(user=self.task.author).delete()
+        notifications = self.task.author.notifications.filter(task=self.task, is_read=False)
+        notifications.update(is_read=True)
+
+        self.authenticate(self.staff)
+        for new_status in (Task.Status.TODO, Task.Status.COMPLETE):
+            self.client.post("/api/tasks/transition/", {
+                "tasks": [str(self.task.uuid)],
+                "status": new_status,
+            }, format="json")
+            self.assertEqual(notifications.count(), 1)
+            self.assertIn("your task", notifications.get().message)
+            self.task.watchers.get_or_create(user=self.task.author)
+
+        self.assertEqual(notifications.get().event_count, 2)
+
+    def test_task_types(self):
+        self.assertQueries(0, "get", "/api/tasks/types/")
+        self.assertQueries(0, "get", "/api/tasks/status/")
+
+    def test_projects(self):
+        self.assertQueries(1, "get", "/api/projects/")
+        self.assertQueries(2, "get", "/api/projects/" + self.project.name + "/")
+
+    def test_comments(self):
+        self.assertQueries(1, "get", "/api/comments/")
+        self.assertQueries(1, "get", "/api/comments/" + str(self.comment.pk) + "/")
+
+    def test_comments_create(self):
+        # notifying the watchers and adding the activity are left to the
+        # outbox worker
+        self.authenticate(self.user)
+        self.assertQueries(10, "post", "/api/comments/", {
+            "task": str(self.task.uuid),
+            "content": "New comment",
+        }, status=201)
+
+    def test_profiles(self):
+        self.assertQueries(1, "get", "/api/profiles/" + self.user.username + "/")
+
+        self.authenticate(self.user)
+        self.assertQueries(3, "put", "/api/profiles/" + self.user.username + "/", {
+            "title": "Tester",
+        })
+
+    def test_token(self):
+        response = self.assertQueries(1, "post", "/api/token/", {
+            "username": self.user.username,
+            "password": "taskboard",
+        })
+        self.assertQueries(0, "post", "/api/token/refresh/", {
+            "refresh": response.json()["refresh"],
+        })
+
+        self.authenticate(self.user)
+        self.assertQueries(0, "get", "/api/token/status/")
+
+    def test_register(self):
+        self.assertQueries(5, "post", "/api/register/", {
+            "username": "newcomer",
+            "password": "newcomer password",
+        }, status=201)
+
+    def test_notifications(self):
+        path = "/api/user/" + self.user.username + "/notifications/"
+        response = self.assertQueries(2, "get", path + "?page_size=2")
+        if response.json()["next"]:
+            self.assertQueries(2, "get", response.json()["next"])
+
+        self.assertQueries(2, "get", path + "unread-count/")
+
+    def test_notifications_mark_read(self):
+        path = "/api/user/" + self.user.username + "/notifications/"
+        unread = self.user.notifications.filter(is_read=False)
+        ids = list(unread.values_list("id", flat=True)[:1])
+
+        self.authenticate(self.staff)
+        self.assertQueries(1, "post", path + "mark-read/", {"ids": ids}, status=403)
+
+        # the user, then a single update
+        self.authenticate(self.user)
+        response = self.assertQueries(2, "post", path + "mark-read/", {"ids": ids})
+        self.assertEqual(response.json()["updated"], len(ids))
+
+        self.assertQueries(2, "post", path + "mark-read/")
+        self.assertFalse(unread.exists())
+        self.assertEqual(self.client.get(path + "unread-count/").json(), {"unread_count": 0})
+
+    def test_notifications_mark_read_invalid(self):
+        path = "/api/user/" + self.user.username + "/notifications/mark-read/"
+        self.authenticate(self.user)
+        for data in (
+            [1, 2], 1, {"ids": 1}, {"ids": ["1"]}, {"ids": [True]},
+            {"ids": list(range(1, views.mark_read_limit + 2))},
+        ):
+            response = self.assertQueries(1, "post", path, data, status=400)
+            self.assertIn("details", response.json())
+
+    def test_notifications_coalesced(self):
+        self.authenticate(self.staff)
+        for number in range(3):
+            self.client.post("/api/comments/", {
+                "task": str(self.task.uuid),
+                "content": "Comment " + str(number),
+            }, format="json")
+        outbox.drain()
+
+        unread = self.task.author.notifications.filter(task=self.task, is_read=False)
+        self.assertEqual(unread.count(), 1)
+        self.assertEqual(unread.get().event_count, 3)
+        self.assertEqual(unread.get().actor, self.staff)
+
+        # once it's read, the next comment starts a new notification
+        unread.update(is_read=True)
+        self.client.post("/api/comments/", {
+            "task": str(self.task.uuid),
+            "content": "Another comment",
+        }, format="json")
+        outbox.drain()
+        self.assertEqual(unread.get().event_count, 1)
+
+    def test_profile(self):
+        self.assertQueries(2, "get", "/api/user/" + self.user.username + "/profile/")
+
+    def test_activity(self):
+        self.assertQueries(2, "get", "/api/user/" + self.user.username + "/activity/")
+
+    def test_streams(self):
+        # streamed bodies are read inside the block, since that's when
+        # their queries run
+        for count, path in (
+            (1, "/api/tasks/?stream=true"),
+            (1, "/api/comments/?stream=true"),
+            (2, "/api/user/" + self.user.username + "/notifications/?stream=true"),
+            (2, "/api/user/" + self.user.username + "/activity/?stream=true"),
+        ):
+            with self.subTest(path=path), self.assertNumQueries(count):
+                response = self.client.get(path)
+                json.loads(b"".join(response.streaming_content))
+
+    def test_streams_match(self):
+        for path in (
+            "/api/user/" + self.user.username + "/notifications/",
+            "/api/user/" + self.user.username + "/activity/",
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path + "?stream=true")
+                streamed = json.loads(b"".join(response.streaming_content))
+
+                page = self.client.get(path + "?page_size=100").json()
+                if isinstance(page, dict):
+                    page = page["results"]
+                self.assertEqual(streamed[:len(page)], page)
+
+    def test_export(self):
+        # the staff user, then the tasks and their comments per chunk
+        self.authenticate(self.staff)
+        for output in ("ndjson", "csv"):
+            with self.subTest(output=output), self.assertNumQueries(3):
+                response = self.client.get("/api/export/?output=" + output)
+                content = b"".join(response.streaming_content)
+            self.assertEqual(response.status_code, 200)
+
+        lines = content.decode().splitlines()
+        self.assertEqual(len(lines), 1 + Comment.objects.count() + \
+            Task.objects.filter(comment_count=0).count())
+
+    def test_slow_queries(self):
+        self.authenticate(self.staff)
+        self.assertQueries(1, "get", "/api/debug/slow-queries/")
+
+    def test_debug_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            name = "20260101T000000-0123abcd.txt"
+            with open(os.path.join(directory, name), "w") as file:
+                file.write("Report\n")
+
+            # the staff user. the file is read from disk
+            self.authenticate(self.staff)
+            with override_settings(TASKBOARD_PROFILE_DIR=directory), self.assertNumQueries(1):
+                response = self.client.get("/api/debug/profiles/" + name)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b"".join(response.streaming_content), b"Report\n")
+            response.close()
+
+    def test_metrics(self):
+        # metrics are kept in a SQLite file of their own, not the database
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                TASKBOARD_METRICS=True,
+                TASKBOARD_METRICS_PATH=os.path.join(directory, "metrics.sqlite3"),
+            ):
+                self.assertQueries(0, "get", "/metrics")
+
+
+@override_settings(
+    TASKBOARD_RESPONSE_CACHE_TIMEOUT=0,
+    TASKBOARD_METRICS=False,
+    TASKBOARD_SLOW_QUERY_MS=0,
+    TASKBOARD_OUTBOX_SYNC=False,
+)
+class SmallDatabaseQueryCountTests(QueryCountTests, TestCase):
+    seed = {
+        "users": 2,
+        "projects": 1,
+        "tasks": 3,
+        "comments": 2,
+        "notifications": 2,
+        "activity": 2,
+    }
+
+
+@override_settings(
+    TASKBOARD_RESPONSE_CACHE_TIMEOUT=0,
+    TASKBOARD_METRICS=False,
+    TASKBOARD_SLOW_QUERY_MS=0,
+    TASKBOARD_OUTBOX_SYNC=False,
+)
+class LargeDatabaseQueryCountTests(QueryCountTests, TestCase):
+    seed = {
+        "users": 5,
+        "projects": 5,
+        "tasks": 150,
+        "comments": 600,
+        "notifications": 200,
+        "activity": 200,
+    }
+
+
+class TaskListTests(TestCase):
+    """Checks paging through the task list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        for n in range(25):
+            Task.objects.create(summary="Task " + str(n), description="", author=cls.author)
+
+        # a few rows share each timestamp, so pages have to break ties
+        # on the uuid
+        tasks = list(Task.objects.all())
+        for n, task in enumerate(tasks):
+            Task.objects.filter(uuid=task.uuid).update(
+                datetime_created=tasks[n // 4 * 4].datetime_created,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def uuids(self, response):
+        return [task["uuid"] for task in response.json()["results"]]
+
+    def test_pages(self):
+        expected = [
+            str(uuid) for uuid in Task.objects.order_by("-datetime_created", "-uuid")
+                .values_list("uuid", flat=True)
+        ]
+
+        pages = []
+        response = self.client.get("/api/tasks/?page_size=4")
+        self.assertIsNone(response.json()["previous"])
+        while True:
+            pages.append(self.uuids(response))
+            if response.json()["next"] is None:
+                break
+            response = self.client.get(response.json()["next"])
+
+        self.assertEqual(len(pages), 7)
+        self.assertEqual([uuid for page in pages for uuid in page], expected)
+
+        # and back again, through the same pages
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.json()["previous"])
+            self.assertEqual(self.uuids(response), page)
+        self.assertIsNone(response.json()["previous"])
+
+    def test_invalid_cursor(self):
+        for cursor in ("nonsense", "eyJwIjpbXX0=", "eyJwIjpbIngiLCJ5Il19"):
+            response = self.client.get("/api/tasks/?cursor=" + cursor)
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_filter(self):
+        task = Task.objects.first()
+        Task.objects.filter(uuid=task.uuid).update(status=Task.Status.COMPLETE)
+
+        response = self.client.get("/api/tasks/?filter=status:" + Task.Status.COMPLETE)
+        self.assertEqual(self.uuids(response), [str(task.uuid)])
+
+        response = self.client.get("/api/tasks/?filter=author:author&page_size=100")
+        self.assertEqual(len(self.uuids(response)), 25)
+
+    def test_invalid_filter(self):
+        for path in (
+            "/api/tasks/?filter=colour:red",
+            "/api/tasks/?filter=status:ZZZZ",
+            "/api/tasks/?filter=type:ZZZZ",
+        ):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn("details", response.json())
+
+    def test_sort(self):
+        for sort in ("created", "edited", "activity"):
+            response = self.client.get("/api/tasks/?sort=" + sort)
+            self.assertEqual(response.status_code, 200, sort)
+
+        response = self.client.get("/api/tasks/?sort=colour")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("details", response.json())
+
+
+class SearchTests(TestCase):
+    """Checks full-text search, and that the index follows changes to
+    tasks and comments."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.kettle = Task.objects.create(
+            summary="Descale the kettle",
+            description="It's <b>furry</b> inside.",
+            author=cls.author,
+        )
+        cls.other = Task.objects.create(summary="Buy milk", description="", author=cls.author)
+        cls.comment = Comment.objects.create(
+            task=cls.other, poster=cls.author, content="Put it next to the kettle.",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get("/api/tasks/search/", {"q": query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_ranking(self):
+        results = self.search("kettle")
+
+        # a match in a summary counts for more than one in a comment
+        self.assertEqual(
+            [(result["uuid"], result["match"]) for result in results],
+            [(str(self.kettle.uuid), "task"), (str(self.other.uuid), "comment")],
+        )
+        self.assertIn("<mark>kettle</mark>", results[0]["snippet"])
+        self.assertEqual(results[1]["summary"], "Buy milk")
+
+    def test_snippet(self):
+        # the text is escaped, but the highlighting isn't
+        results = self.search("furry")
+        self.assertEqual(len(results), 1)
+        self.assertIn("&lt;b&gt;<mark>furry</mark>&lt;/b&gt;", results[0]["snippet"])
+
+        # the last word matches as a prefix
+        self.assertEqual(len(self.search("ket")), 2)
+
+    def test_missing_query(self):
+        response = self.client.get("/api/tasks/search/?q=")
+        self.assertEqual(response.status_code, 400)
+
+    def test_update(self):
+        self.kettle.summary = "Descale the teapot"
+        self.kettle.save()
+        self.comment.content = "Put it next to the teapot."
+        self.comment.save()
+
+        self.assertEqual(self.search("kettle"), [])
+        self.assertEqual(len(self.search("teapot")), 2)
+
+    def test_delete(self):
+        self.comment.delete()
+        self.assertEqual([result["match"] for result in self.search("kettle")], ["task"])
+
+        Comment.objects.create(task=self.other, poster=self.author, content="Or the kettle.")
+        self.other.delete()
+        self.kettle.delete()
+        self.assertEqual(self.search("kettle"), [])
+        self.assertEqual(self.search("milk"), [])
+
+        # hits are joined to their task, so check the index itself too
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM " + search.TABLE)
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class TaskActivityTests(TestCase):
+    """Checks the comment_count and last_activity_at fields kept on tasks
+    by the comment signal handlers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.old = Task.objects.create(summary="Old", description="", author=cls.author)
+        cls.new = Task.objects.create(summary="New", description="", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, task):
+        return Comment.objects.create(task=task, poster=self.author, content="Hello")
+
+    def activity_order(self):
+        response = self.client.get("/api/tasks/?sort=activity")
+        return [task["summary"] for task in response.json()["results"]]
+
+    def test_new_comment(self):
+        self.assertEqual(self.activity_order(), ["New", "Old"])
+
+        comment = self.comment(self.old)
+        self.old.refresh_from_db()
+        self.assertEqual(self.old.comment_count, 1)
+        self.assertEqual(self.old.last_activity_at, comment.date_created)
+
+        # commented on most recently, so first
+        self.assertEqual(self.activity_order(), ["Old", "New"])
+
+    def test_deleted_comment(self):
+        first = self.comment(self.old)
+        second = self.comment(self.old)
+
+        second.delete()
+        self.old.refresh_from_db()
+        self.assertEqual(self.old.comment_count, 1)
+        self.assertEqual(self.old.last_activity_at, first.date_created)
+
+        first.delete()
+        self.old.refresh_from_db()
+        self.assertEqual(self.old.comment_count, 0)
+        self.assertEqual(self.old.last_activity_at, self.old.datetime_created)
+        self.assertEqual(self.activity_order(), ["New", "Old"])
+
+    def test_backfill(self):
+        comments = [self.comment(self.old), self.comment(self.old)]
+        Task.objects.update(comment_count=7, last_activity_at=timezone.now())
+
+        output = StringIO()
+        call_command("backfill_task_activity", batch_size=1, stdout=output)
+        self.assertIn("Updated 2 tasks.", output.getvalue())
+
+        self.old.refresh_from_db()
+        self.new.refresh_from_db()
+        self.assertEqual(self.old.comment_count, 2)
+        self.assertEqual(self.old.last_activity_at, comments[1].date_created)
+        self.assertEqual(self.new.comment_count, 0)
+        self.assertEqual(self.new.last_activity_at, self.new.datetime_created)
+
+
+class TaskDetailTests(TestCase):
+    """Checks a task's details and its comments."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.task = Task.objects.create(summary="Task", description="", author=cls.author)
+        for n in range(5):
+            Comment.objects.create(task=cls.task, poster=cls.author, content="Comment " + str(n))
+
+    def setUp(self):
+        cache.clear()
+        self.path = "/api/tasks/" + str(self.task.uuid) + "/"
+
+    def contents(self, comments):
+        return [comment["content"] for comment in comments]
+
+    def test_comments(self):
+        data = self.client.get(self.path).json()
+        self.assertEqual(self.contents(data["comments"]), ["Comment " + str(n) for n in range(5)])
+        self.assertNotIn("comment_count", data)
+
+    def test_comments_limit(self):
+        data = self.client.get(self.path + "?comments=2").json()
+        self.assertEqual(self.contents(data["comments"]), ["Comment 3", "Comment 4"])
+        self.assertEqual(data["comment_count"], 5)
+
+        data = self.client.get(self.path + "?comments=0").json()
+        self.assertEqual(data["comments"], [])
+        self.assertEqual(data["comment_count"], 5)
+
+        data = self.client.get(self.path + "?comments=10").json()
+        self.assertEqual(len(data["comments"]), 5)
+
+        for value in ("-1", "some"):
+            response = self.client.get(self.path + "?comments=" + value)
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_comments_pages(self):
+        contents = []
+        response = self.client.get(self.path + "comments/?page_size=2")
+        while True:
+            contents += self.contents(response.json()["results"])
+            if response.json()["next"] is None:
+                break
+            response = self.client.get(response.json()["next"])
+
+        self.assertEqual(contents, ["Comment " + str(n) for n in range(5)])
+
+    def assertNotModified(self, etag):
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def assertModified(self, etag):
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response["ETag"]
+
+    def test_not_modified(self):
+        etag = self.client.get(self.path)["ETag"]
+        self.assertNotModified(etag)
+
+        # a new comment moves the task's comment count and activity
+        Comment.objects.create(task=self.task, poster=self.author, content="Another")
+        etag = self.assertModified(etag)
+        self.assertNotModified(etag)
+
+        self.task.status = Task.Status.TODO
+        self.task.save()
+        etag = self.assertModified(etag)
+
+        # bulk transitions update the edit time themselves
+        staff = TaskboardUser.objects.create_user(username="staff", password="staff", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        response = client.post(
+            "/api/tasks/transition/",
+            {"tasks": [str(self.task.uuid)], "status": Task.Status.COMPLETE},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertModified(etag)
+
+    def test_modified_by_comments(self):
+        etag = self.client.get(self.path)["ETag"]
+
+        comment = self.task.comments.first()
+        comment.content = "Edited"
+        comment.save()
+        etag = self.assertModified(etag)
+
+        # the detail view shows the posters' names
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.put("/api/profiles/author/", {"name": "Renamed"}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertModified(etag)
+        comments = self.client.get(self.path).json()["comments"]
+        self.assertEqual({comment["poster_name"] for comment in comments}, {"Renamed"})
+
+    def test_modified_since(self):
+        # Last-Modified only has whole seconds, so start well before now
+        an_hour_ago = timezone.now() - datetime.timedelta(hours=1)
+        Task.objects.filter(uuid=self.task.uuid).update(
+            datetime_edited=an_hour_ago,
+            last_activity_at=an_hour_ago,
+            related_changed_at=an_hour_ago,
+        )
+
+        last_modified = self.client.get(self.path)["Last-Modified"]
+        response = self.client.get(self.path, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        self.task.comments.last().delete()
+        response = self.client.get(self.path, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["comments"]), 4)
+
+
+@override_settings(TASKBOARD_RESPONSE_CACHE_TIMEOUT=300)
+class ResponseCacheTests(TestCase):
+    """Checks that cached responses are reused, and dropped when the data
+    behind them changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.staff = TaskboardUser.objects.create_user(
+            username="staff", password="staff", is_staff=True,
+        )
+        cls.project = Project.objects.create(name="Taskboard", summary="")
+        cls.task = Task.objects.create(summary="Task", description="", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertCached(self, path, **headers):
+        with self.assertNumQueries(0):
+            response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 200)
+
+    def assertNotCached(self, path, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+    def test_hit(self):
+        for path in ("/api/tasks/", "/api/projects/", "/api/tasks/types/"):
+            self.client.get(path)
+            self.assertCached(path)
+
+        # a different query string is a different response
+        self.assertNotCached("/api/tasks/?page_size=1")
+
+    def test_invalidated_by_task(self):
+        self.client.get("/api/tasks/")
+        self.task.summary = "Renamed"
+        self.task.save()
+        self.assertNotCached("/api/tasks/")
+        self.assertCached("/api/tasks/")
+
+        Task.objects.create(summary="New", description="", author=self.author)
+        self.assertNotCached("/api/tasks/")
+
+    def test_invalidated_by_comment(self):
+        self.client.get("/api/tasks/")
+        comment = Comment.objects.create(task=self.task, poster=self.author, content="Hello")
+        self.assertNotCached("/api/tasks/")
+
+        comment.delete()
+        self.assertNotCached("/api/tasks/")
+
+    def test_invalidated_by_project(self):
+        self.client.get("/api/tasks/")
+        self.client.get("/api/projects/")
+        self.project.summary = "Changed"
+        self.project.save()
+        self.assertNotCached("/api/tasks/")
+        self.assertNotCached("/api/projects/")
+
+    def test_invalidated_by_transition(self):
+        self.client.get("/api/tasks/")
+        self.client.force_authenticate(self.staff)
+        response = self.client.post("/api/tasks/transition/", {
+            "tasks": [str(self.task.uuid)],
+            "status": Task.Status.COMPLETE,
+        }, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotCached("/api/tasks/")
+
+    def test_invalidated_by_bulk(self):
+        self.client.get("/api/tasks/")
+        self.client.force_authenticate(self.author)
+        response = self.client.post("/api/tasks/bulk/", [
+            {"summary": "Bulk", "description": "", "project": self.project.name},
+        ], format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertNotCached("/api/tasks/")
+
+    def test_browsable_api(self):
+        # the page shows who's logged in, so it's never cached
+        self.client.force_authenticate(self.author)
+        self.client.get("/api/tasks/", HTTP_ACCEPT="text/html")
+        self.assertNotCached("/api/tasks/", HTTP_ACCEPT="text/html")
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Checks that concurrent calls with the same key share one run."""
+
+    def run_threads(self, flight, keys, function):
+        """Calls `flight.do` with each key, each from its own thread, and
+        returns the results, and any errors raised, in no set order."""
+
+        results = []
+
+        def call(key):
+            try:
+                results.append(flight.do(key, function))
+            except Exception as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=call, args=(key,)) for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            # long enough for every thread to start waiting on this call
+            time.sleep(0.2)
+            return "loaded"
+
+        results = self.run_threads(flight, ["key"] * 20, load)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["loaded"] * 20)
+
+        # once the call is done, the next one runs again
+        flight.do("key", load)
+        self.assertEqual(len(calls), 2)
+
+    def test_keys(self):
+        flight = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.2)
+
+        self.run_threads(flight, ["a", "b", "a", "b"], load)
+        self.assertEqual(len(calls), 2)
+
+    def test_failure(self):
+        flight = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.2)
+            if len(calls) == 1:
+                raise ValueError
+
+        # the waiting calls don't get the first call's error, they run
+        # the function themselves
+        results = self.run_threads(flight, ["key"] * 3, load)
+        self.assertEqual(len([result for result in results if isinstance(result, ValueError)]), 1)
+        self.assertEqual(len(calls), 3)
+
+
+class ServerTimingTests(TestCase):
+    """Checks the Server-Timing and X-DB-Queries headers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.task = Task.objects.create(summary="Task", description="", author=cls.author)
+
+    @override_settings(TASKBOARD_SERVER_TIMING=True, TASKBOARD_RESPONSE_CACHE_TIMEOUT=0)
+    def test_headers(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/tasks/" + str(self.task.uuid) + "/")
+
+        match = re.fullmatch(
+            r'db;dur=(\d+\.\d\d);desc="(\d+) queries", serialize;dur=(\d+\.\d\d), '
+            r"render;dur=(\d+\.\d\d), view;dur=(\d+\.\d\d)",
+            response["Server-Timing"],
+        )
+        self.assertIsNotNone(match, response["Server-Timing"])
+
+        db, count, serialize, render, view = match.groups()
+        self.assertEqual(int(count), len(queries.captured_queries))
+        self.assertEqual(response["X-DB-Queries"], count)
+        self.assertLessEqual(float(db) + float(serialize) + float(render), float(view) + 0.02)
+        self.assertEqual(response["Timing-Allow-Origin"], "*")
+
+    @override_settings(TASKBOARD_SERVER_TIMING=False)
+    def test_off(self):
+        response = self.client.get("/api/tasks/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertNotIn("X-DB-Queries", response)
+
+
+class SlowQueryTests(TestCase):
+    """Checks that statements over the threshold are logged with their
+    query plan, and the others aren't."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        Task.objects.create(summary="Task", description="", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(TASKBOARD_SLOW_QUERY_MS=0.000001, TASKBOARD_RESPONSE_CACHE_TIMEOUT=0)
+    def test_recorded(self):
+        self.client.get("/api/tasks/")
+
+        entries = slowqueries.get_entries()
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry["view"], "TaskViewSet.list")
+        self.assertIn('FROM "tasks_task"', entry["sql"])
+        self.assertGreater(entry["duration_ms"], 0)
+        self.assertTrue(entry["plan"])
+        self.assertTrue(all(isinstance(line, str) for line in entry["plan"]))
+
+    @override_settings(TASKBOARD_SLOW_QUERY_MS=60000, TASKBOARD_RESPONSE_CACHE_TIMEOUT=0)
+    def test_fast(self):
+        self.client.get("/api/tasks/")
+        self.assertEqual(slowqueries.get_entries(), [])
+
+
+class ProfilingTests(TestCase):
+    """Checks that staff users, and only them, can profile requests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = TaskboardUser.objects.create_user(username="user", password="user")
+        cls.staff = TaskboardUser.objects.create_user(
+            username="staff", password="staff", is_staff=True,
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        override = override_settings(TASKBOARD_PROFILING=True, TASKBOARD_PROFILE_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + str(token))
+
+    def test_staff(self):
+        self.authenticate(self.staff)
+        response = self.client.get("/api/tasks/?profile=1")
+        self.assertEqual(response.status_code, 200)
+
+        name = response["X-Profile"].rsplit("/", 1)[1]
+        self.assertTrue(name.endswith(".prof"))
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [name, name.replace(".prof", ".txt")],
+        )
+        self.assertNotIn("X-Profile-Memory", response)
+
+        # the report can be downloaded through the link
+        response = self.client.get(response["X-Profile"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_memory(self):
+        self.authenticate(self.staff)
+        response = self.client.get("/api/tasks/", HTTP_X_PROFILE="memory")
+        self.assertIn("X-Profile", response)
+        self.assertIn("X-Profile-Memory", response)
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+    def test_not_staff(self):
+        self.authenticate(self.user)
+        response = self.client.get("/api/tasks/?profile=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile", response)
+
+        self.client.credentials()
+        response = self.client.get("/api/tasks/?profile=1")
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_off(self):
+        self.authenticate(self.staff)
+        with override_settings(TASKBOARD_PROFILING=False):
+            response = self.client.get("/api/tasks/?profile=1")
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class MetricsTests(TestCase):
+    """Checks the metrics served to Prometheus at /metrics."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        override = override_settings(
+            TASKBOARD_METRICS=True,
+            TASKBOARD_METRICS_PATH=os.path.join(directory.name, "metrics.sqlite3"),
+            TASKBOARD_METRICS_TOKEN=None,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get_samples(self, content):
+        """Parses the text format into `{(name, labels): value}`, checking
+        that every sample follows its HELP and TYPE lines."""
+
+        samples = {}
+        types = {}
+        for line in content.splitlines():
+            if line.startswith("# HELP "):
+                continue
+            if line.startswith("# TYPE "):
+                metric, type = line[len("# TYPE "):].split(" ")
+                types[metric] = type
+                continue
+
+            match = re.fullmatch(r'([a-z_]+)(?:\{((?:[a-z_]+="[^"]*",?)*)\})? ([0-9.e+-]+)', line)
+            self.assertIsNotNone(match, line)
+            name, labels, value = match.groups()
+            self.assertTrue(
+                any(name == metric or name.startswith(metric + "_") for metric in types),
+                name,
+            )
+            labels = tuple(sorted(re.findall(r'([a-z_]+)="([^"]*)"', labels or "")))
+            samples[(name, labels)] = float(value)
+
+        self.assertEqual(types, {metric: info[0] for metric, info in metrics.METRICS.items()})
+        return samples
+
+    def test_exposition(self):
+        self.client.get("/api/tasks/")
+        self.client.get("/api/tasks/")
+        self.client.get("/api/projects/")
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        samples = self.get_samples(response.content.decode("utf-8"))
+
+        route = (("method", "GET"), ("route", "tasks-list"))
+        self.assertEqual(
+            samples[("taskboard_requests_total", route + (("status", "200"),))], 2,
+        )
+
+        # buckets are cumulative, and the last one holds every request
+        buckets = [
+            value for (name, labels), value in samples.items()
+            if name == "taskboard_request_duration_seconds_bucket"
+                and dict(labels)["route"] == "tasks-list"
+        ]
+        self.assertEqual(len(buckets), len(metrics.DURATION_BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 2)
+        self.assertEqual(samples[("taskboard_request_duration_seconds_count", route)], 2)
+        self.assertIn(("taskboard_request_queries_sum", route), samples)
+
+    def test_token(self):
+        with override_settings(TASKBOARD_METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+            self.assertEqual(response.status_code, 200)
+
+    def test_off(self):
+        with override_settings(TASKBOARD_METRICS=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+
+@override_settings(TASKBOARD_OUTBOX_SYNC=False)
+class OutboxTests(TestCase):
+    """Checks that the side effects of saves are queued in the outbox,
+    and carried out by the worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = TaskboardUser.objects.create_user(username="author", password="author")
+        cls.poster = TaskboardUser.objects.create_user(username="poster", password="poster")
+        cls.task = Task.objects.create(summary="Task", description="", author=cls.author)
+
+    def comment(self):
+        return Comment.objects.create(task=self.task, poster=self.poster, content="Hello")
+
+    def test_worker(self):
+        comment = self.comment()
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+        self.assertFalse(Notification.objects.exists())
+
+        call_command("run_taskboard_worker", once=True, stdout=StringIO())
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(self.author.notifications.get().task, self.task)
+        activity = Activity.objects.get(type=Activity.Type.NEW_COMMENT)
+        self.assertEqual(activity.user, self.poster)
+        self.assertEqual(activity.datetime_created, comment.date_created)
+        self.assertTrue(Activity.objects.filter(type=Activity.Type.NEW_TASK).exists())
+
+    def test_retry(self):
+        self.comment()
+        OutboxEvent.objects.create(type=OutboxEvent.Type.NEW_TASK, payload={})
+
+        # the bad event doesn't hold the others back, and is retried later
+        self.assertEqual(outbox.drain(), 3)
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("KeyError", event.last_error)
+        self.assertEqual(outbox.claim(), [])
+        self.assertTrue(self.author.notifications.exists())
+
+    def test_claim(self):
+        self.comment()
+        self.assertEqual(len(outbox.claim(batch_size=1)), 1)
+
+        # claimed events aren't claimed again until their lease runs out
+        self.assertEqual(len(outbox.claim()), 1)
+        self.assertEqual(outbox.claim(), [])
+
+    def test_edit(self):
+        comment = self.comment()
+        outbox.drain()
+
+        # only new comments notify watchers
+        comment.content = "Edited"
+        comment.save()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_status_change(self):
+        outbox.drain()
+        task = Task.objects.get(uuid=self.task.uuid)
+        task.summary = "Renamed"
+        task.save()
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        # saved from the admin, the change is put down to the staff member
+        task.status = Task.Status.TODO
+        request = RequestFactory().post("/admin/")
+        request.user = self.poster
+        admin.site._registry[Task].save_model(request, task, None, True)
+        task.save()
+        self.assertEqual(OutboxEvent.objects.get().type, OutboxEvent.Type.STATUS_CHANGE)
+
+        outbox.drain()
+        self.assertEqual(
+            Activity.objects.get(type=Activity.Type.TASK_STATUS_CHANGE).user, self.poster,
+        )
+        self.assertIn("has changed the status of your task", self.author.notifications.get().message)
+
+        # without a user, it's put down to the author, who isn't notified
+        task = Task.objects.get(uuid=self.task.uuid)
+        task.status = Task.Status.COMPLETE
+        task.save()
+        outbox.drain()
+        self.assertEqual(
+            Activity.objects.filter(type=Activity.Type.TASK_STATUS_CHANGE, user=self.author).count(), 1,
+        )
+        self.assertEqual(self.author.notifications.get().event_count, 1)
+
+    @override_settings(TASKBOARD_OUTBOX_SYNC=True)
+    def test_sync(self):
+        self.comment()
+        self.assertFalse(OutboxEvent.objects.filter(type=OutboxEvent.Type.NEW_COMMENT).exists())
+        self.assertTrue(self.author.notifications.exists())
+
+
+class ExportTests(TestCase):
+    """Checks the edited_after and edited_before bounds of the export."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = TaskboardUser.objects.create_user(
+            username="staff", password="staff", is_staff=True,
+        )
+        for day in (1, 2, 3):
+            task = Task.objects.create(summary="Day " + str(day), description="", author=cls.staff)
+            Task.objects.filter(uuid=task.uuid).update(
+                datetime_edited=datetime.datetime(2024, 3, day, tzinfo=datetime.timezone.utc),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self, query):
+        # naive datetimes reaching the database would warn
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            response = self.client.get("/api/export/?" + query)
+            self.assertEqual(response.status_code, 200)
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        return sorted(json.loads(line)["summary"] for line in lines)
+
+    def test_bounds(self):
+        # edited_after is inclusive, and edited_before isn't
+        self.assertEqual(
+            self.export("edited_after=2024-03-02T00:00:00Z"), ["Day 2", "Day 3"],
+        )
+        self.assertEqual(
+            self.export("edited_before=2024-03-02T00:00:00Z"), ["Day 1"],
+        )
+        self.assertEqual(
+            self.export("edited_after=2024-03-01T00:00:00Z&edited_before=2024-03-03T00:00:00Z"),
+            ["Day 1", "Day 2"],
+        )
+
+    def test_naive(self):
+        # taken as UTC
+        self.assertEqual(self.export("edited_after=2024-03-02T00:00:00"), ["Day 2", "Day 3"])
+        self.assertEqual(
+            self.export("edited_after=2024-03-02T00:00:00%2B01:00"), ["Day 2", "Day 3"],
+        )
+
+    def test_invalid(self):
+        for query in ("edited_after=yesterday", "edited_before=2024-13-01T00:00:00", "output=xml"):
+            response = self.client.get("/api/export/?" + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("details", response.json())
+
+
+class ImportTests(TestCase):
+    """Checks that import_taskboard loads what export_taskboard wrote."""
+
+    def export(self):
+        output = StringIO()
+        call_command("export_taskboard", stdout=output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        # comments get new ids when they're imported
+        for record in records:
+            for comment in record["comments"]:
+                del comment["id"]
+        return output.getvalue(), records
+
+    def test_round_trip(self):
+        call_command("seed_taskboard", seed=1, users=3, projects=2, tasks=20,
+            comments=60, notifications=0, activity=0, stdout=StringIO())
+        content, records = self.export()
+        word = Comment.objects.first().content.split()[0]
+        hits = len(search.search(word, limit=1000))
+
+        Task.objects.all().delete()
+        Activity.objects.all().delete()
+
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as file:
+            file.write(content)
+            file.flush()
+            # the users, projects and existing tasks, then a transaction
+            # with a statement per table
+            with self.assertNumQueries(11):
+                call_command("import_taskboard", file.name, stdout=StringIO())
+
+        self.assertEqual(self.export()[1], records)
+        self.assertEqual(len(search.search(word, limit=1000)), hits)
+        self.assertEqual(Activity.objects.count(), Task.objects.count() + Comment.objects.count())
+
+        # importing again skips every task
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as file:
+            file.write(content)
+            file.flush()
+            call_command("import_taskboard", file.name, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Task.objects.count(), len(records))
+
+    def import_lines(self, lines, **options):
+        # lines can be bytes, to write ones that aren't UTF-8
+        lines = [line if isinstance(line, bytes) else line.encode() for line in lines]
+        with tempfile.NamedTemporaryFile("wb", suffix=".ndjson") as file:
+            file.write(b"\n".join(lines) + b"\n")
+            file.flush()
+            errors = StringIO()
+            call_command("import_taskboard", file.name, stdout=StringIO(), stderr=errors, **options)
+        return errors.getvalue()
+
+    def test_invalid_records(self):
+        TaskboardUser.objects.create_user(username="author", password="author")
+
+        def record(summary, **fields):
+            return json.dumps(dict({"summary": summary, "author": "author"}, **fields))
+
+        for options in ({}, {"create_missing": True}):
+            Task.objects.all().delete()
+            errors = self.import_lines([
+                record("First", comments=[{"poster": "author", "content": "Fine"}]),
+                record("Odd comment", comments=["Not an object"]),
+                record("Odd comments", comments="Not a list"),
+                record("Odd author", author=["author"]),
+                record("Odd project", project={"name": "Taskboard"}),
+                "{not json",
+                record("Last"),
+            ], **options)
+
+            # bad records are reported with their line, and the rest are
+            # still imported
+            self.assertEqual(
+                sorted(Task.objects.values_list("summary", flat=True)), ["First", "Last"],
+            )
+            self.assertEqual(Comment.objects.count(), 1)
+            for number in range(2, 7):
+                self.assertIn("Line " + str(number) + ":", errors)
+            self.assertIn("comment 1 is not an object", errors)
+
+    def test_undecodable_line(self):
+        TaskboardUser.objects.create_user(username="author", password="author")
+
+        errors = self.import_lines([
+            json.dumps({"summary": "First", "author": "author"}),
+            b'{"summary": "\xff\xfe", "author": "author"}',
+            json.dumps({"summary": "Last \u2713", "author": "author"}, ensure_ascii=False),
+        ])
+
+        self.assertEqual(
+            sorted(Task.objects.values_list("summary", flat=True)), ["First", "Last \u2713"],
+        )
+        self.assertIn("Line 2: invalid UTF-8", errors)
+        self.assertNotIn("Line 1", errors)
+        self.assertNotIn("Line 3", errors)
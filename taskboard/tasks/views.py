@@ -1,13 +1,20 @@
 from django.shortcuts import render, get_object_or_404
 
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, schema, permission_classes
+from rest_framework.decorators import action, api_view, schema, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import (
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 from .serializers import (
     TaskOverviewSerializer,
     TaskDetailsSerializer,
     TaskCreateSerializer,
+    TaskBulkCreateSerializer,
     CommentSerializer,
     CommentCreateSerializer,
     ProjectOverviewSerializer,
@@ -15,57 +22,309 @@ from .serializers import (
     NotificationDetailsSerializer,
     ActivityDetailsSerializer,
 )
-from .models import Task, Comment, Project, Notification, Activity
+from .models import Task, TaskWatcher, Comment, Project, Notification, Activity
+from .pagination import KeysetPagination
+from .cache import cache_response, invalidate
+from .singleflight import coalesce_response
+from .streaming import stream_json, wants_stream
+from .notifications import notify_watchers, watch
+from . import export, search
 from users.models import TaskboardUser
+from taskboard.conditional import conditional, make_etag
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+import datetime
 import uuid
 
 
+def comments_with_posters():
+    """Returns a queryset of comments, joined with the only fields of
+    their posters that CommentSerializer uses."""
+
+    return Comment.objects.select_related("poster").only(
+        "content",
+        "date_created",
+        "task_id",
+        "poster__username",
+        "poster__name",
+    ).order_by("date_created", "id")
+
+
+def task_validators(request, uuid=None):
+    """Returns the ETag and Last-Modified values of a task's detail
+    view.
+
+    Besides the task itself, the detail view shows its comments, their
+    posters' names, and the names of its author and project. Changes to
+    those don't touch `datetime_edited`, but they do move
+    `related_changed_at`, which is on the task row too. So this is a
+    single query, without touching the comments."""
+
+    try:
+        values = Task.objects.filter(uuid=uuid).values_list(
+            "datetime_edited",
+            "last_activity_at",
+            "related_changed_at",
+            "comment_count",
+            "author__username",
+            "author__name",
+            "project__name",
+        ).first()
+    except ValidationError:
+        return None
+
+    if values is None:
+        return None
+
+    last_modified = max(values[:3])
+    etag = make_etag(*values, request.GET.get("comments", ""))
+
+    return etag, last_modified
+
+
+def project_validators(request, name=None):
+    """Returns the ETag of a project's detail view."""
+
+    values = Project.objects.filter(name=name) \
+        .values_list("id", "name", "summary", "type").first()
+
+    if values is None:
+        return None
+
+    return make_etag(*values), None
+
+
 class TaskViewSet(viewsets.ViewSet):
     """ViewSet for the Task model."""
 
     permission_classes=(IsAuthenticatedOrReadOnly,)
     lookup_field = "uuid"
 
+    bulk_limit = 500
+    """Most tasks that can be created, or moved, with one bulk request."""
+
+    @method_decorator(cache_response("tasks"))
+    @method_decorator(coalesce_response("tasks"))
     def list(self, request):
-        """Returns a list of tasks.
+        """Returns a page of tasks.
         
         Tasks are returned in reverse chronological order; newest to
         oldest. When listing tasks, only the UUID and summary fields
-        are returned."""
+        are returned.
+
+        The `sort` parameter changes what "newest" means: `created`
+        (the default), `edited`, or `activity` for the tasks that were
+        most recently commented on.
+
+        Tasks can be narrowed down with one or more `filter` parameters
+        of the form `field:value`, where field is one of status, type,
+        project (name) or author (username).
+
+        Pages are linked with opaque cursors in the `next` and
+        `previous` fields, rather than page numbers.
 
-        sort_style = "-datetime_created"
+        With `stream=true`, every matching task is streamed as a single
+        JSON array instead, unpaginated."""
 
+        ordering = ("-datetime_created", "-uuid")
+        queryset = Task.objects.all()
+
+        # filters are given as `field:value`, e.g.
+        # ?filter=status:TODO&filter=project:Taskboard. repeating a field
+        # matches any of its values
         if request.GET.get("filter", "") != "":
-            pass
+            filters = {}
+
+            for item in request.GET.getlist("filter"):
+                field, _, value = item.partition(":")
+                filters.setdefault(field, []).append(value)
+
+            for field, values in filters.items():
+                match field:
+                    case "status":
+                        choices = Task.Status.values
+                        lookup = "status__in"
+                    case "type":
+                        choices = Task.Type.values
+                        lookup = "type__in"
+                    case "project":
+                        choices = None
+                        lookup = "project__name__in"
+                    case "author":
+                        choices = None
+                        lookup = "author__username__in"
+                    case _:
+                        message = {
+                            "details" : "Cannot filter tasks by " + \
+                                str(field) + ". Tasks can be filtered by " + \
+                                "status, type, project, or author."
+                        }
+                        return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+                invalid = [value for value in values if choices is not None and value not in choices]
+                if invalid:
+                    message = {
+                        "details" : str(invalid[0]) + " is not a valid " + \
+                            str(field) + ". Valid values are: " + \
+                            ", ".join(choices) + "."
+                    }
+                    return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+                queryset = queryset.filter(**{lookup: values})
 
         # https://stackoverflow.com/a/3500905
         if request.GET.get("sort", "") != "":
             match request.GET.get("sort"):
                 case "created": # default
-                    sort_style = "-datetime_created"
+                    ordering = ("-datetime_created", "-uuid")
                     pass
                 case "edited":
-                    sort_style = "-datetime_edited"
+                    ordering = ("-datetime_edited", "-uuid")
+                case "activity":
+                    ordering = ("-last_activity_at", "-uuid")
                 case _:
-                    pass # TODO: draw exception?
-
-        queryset = Task.objects.prefetch_related(
-                Prefetch("comments", queryset=Comment.objects.order_by("-date_created"))
-            ).order_by(sort_style)
-
-        serializer = TaskOverviewSerializer(queryset, many=True)
-        return Response(serializer.data)
+                    message = {
+                        "details" : "Cannot sort tasks by " + \
+                            str(request.GET.get("sort")) + ". Tasks can be " + \
+                            "sorted by created, edited, or activity."
+                    }
+                    return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        if wants_stream(request):
+            return stream_json(queryset.order_by(*ordering), TaskOverviewSerializer)
+
+        paginator = KeysetPagination(ordering=ordering)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = TaskOverviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
+    @action(detail=False)
+    def search(self, request):
+        """Returns a page of tasks and comments matching the `q`
+        parameter, best matches first.
+
+        Each result links to a task, and includes a snippet of the
+        matched text with the matching words wrapped in `<mark>` tags.
+        Comments are returned as results of their own, so a task can
+        show up more than once."""
+
+        query = request.GET.get("q", "")
+        if query.strip() == "":
+            message = {
+                "details" : "Missing a search query. Use the q parameter " \
+                    "to search for tasks."
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = KeysetPagination(ordering=("score", "rowid"))
+        paginator.read_request(request)
+
+        position = paginator.position
+        if position is not None:
+            try:
+                position = (float(position[0]), int(position[1]))
+            except (TypeError, ValueError):
+                raise NotFound(paginator.invalid_cursor_message)
+
+        hits = search.search(
+            query,
+            position=position,
+            reverse=paginator.reverse,
+            limit=paginator.page_size + 1,
+        )
+        page = paginator.paginate_rows(hits)
+
+        results = []
+        for hit in page:
+            results.append({
+                "uuid": str(hit.task_uuid),
+                "summary": hit.summary,
+                "type": hit.type,
+                "match": "comment" if hit.rowid < 0 else "task",
+                "snippet": hit.snippet,
+            })
+
+        return paginator.get_paginated_response(results)
+
+    @method_decorator(conditional(task_validators))
     def retrieve(self, request, uuid=None):
         """Returns a single task.
         
-        Use a task's UUID to access it directly."""
-        queryset = Task.objects.all()
+        Use a task's UUID to access it directly.
+        
+        The task, its author and its project are loaded in one query,
+        and the comments along with their posters in a second one.
+
+        Pass `comments=N` to only include the newest N comments, plus
+        a `comment_count` of all of them. The rest can be paged
+        through with the comments action."""
+
+        queryset = Task.objects.select_related("author", "project")
+
+        if request.GET.get("comments", "") == "":
+            queryset = queryset.prefetch_related(
+                Prefetch("comments", queryset=comments_with_posters())
+            )
+            task = get_object_or_404(queryset, uuid=uuid)
+            serializer = TaskDetailsSerializer(task)
+            return Response(serializer.data)
+
+        try:
+            comments_limit = int(request.GET.get("comments"))
+            if comments_limit < 0:
+                raise ValueError
+        except ValueError:
+            message = {
+                "details" : "The comments parameter should be a number of 0 " \
+                    "or more, got " + str(request.GET.get("comments")) + "."
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
         task = get_object_or_404(queryset, uuid=uuid)
-        serializer = TaskDetailsSerializer(task)
+
+        # newest first so the (task, date_created) index can stop after
+        # N rows, then flipped back into the usual oldest first order
+        comments = comments_with_posters().filter(task=task) \
+            .order_by("-date_created", "-id")[:comments_limit]
+
+        context = {
+            "comments": list(reversed(comments)),
+            "comment_count": task.comment_count,
+        }
+        serializer = TaskDetailsSerializer(task, context=context)
         return Response(serializer.data)
+
+    @action(detail=True)
+    def comments(self, request, uuid=None):
+        """Returns a page of a task's comments, oldest to newest."""
+
+        task = get_object_or_404(Task.objects.only("uuid"), uuid=uuid)
+
+        queryset = comments_with_posters().filter(task=task)
+        paginator = KeysetPagination(ordering=("date_created", "id"))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = CommentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
+    @action(detail=True, methods=["post", "delete"], permission_classes=(IsAuthenticated,))
+    def watch(self, request, uuid=None):
+        """Starts (POST) or stops (DELETE) watching a task. Watchers are
+        notified of new comments and status changes on the task."""
+
+        task = get_object_or_404(Task.objects.only("uuid"), uuid=uuid)
+
+        if request.method == "DELETE":
+            TaskWatcher.objects.filter(task=task, user=request.user).delete()
+        else:
+            watch([(task.uuid, request.user.id)])
+
+        return Response({"watching": request.method != "DELETE"})
+
     def create(self, request):
         data_copy = request.data.copy()
 
@@ -96,12 +355,167 @@ class TaskViewSet(viewsets.ViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Creates a list of tasks, all or nothing.
+
+        Takes a JSON array of tasks in the same format as creating a
+        single task. If any of them is invalid, none are created, and the
+        `errors` field of the response has an entry per task, in order,
+        which is empty for the valid ones."""
+
+        if not isinstance(request.data, list):
+            message = {
+                "details" : "Expected a list of tasks.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(request.data) > self.bulk_limit:
+            message = {
+                "details" : "Can't create more than " + \
+                    str(self.bulk_limit) + " tasks at once.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        # every project named in the request, in one query
+        names = {
+            str(item["project"]) for item in request.data
+            if isinstance(item, dict) and item.get("project") not in (None, "")
+        }
+        projects = {
+            project.name: project
+            for project in Project.objects.filter(name__in=names)
+        }
+
+        serializer = TaskBulkCreateSerializer(
+            data=request.data,
+            many=True,
+            context={"projects": projects},
+        )
+
+        if not serializer.is_valid():
+            message = {
+                "details" : "Some of the tasks are invalid, so none were " \
+                    "created.",
+                "errors" : serializer.errors,
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save(author=request.user)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], permission_classes=(IsAdminUser,))
+    def transition(self, request):
+        """Moves a list of tasks to a new status. Staff only.
+
+        Takes `tasks`, a list of task UUIDs, and `status`. The tasks are
+        updated with a single query, and every task whose status changed
+        gets a status change activity, and its watchers are notified.
+        Tasks already in that status are left alone."""
+
+        if not isinstance(request.data, dict):
+            message = {
+                "details" : "Expected an object with tasks and status fields.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        new_status = request.data.get("status")
+        if new_status not in Task.Status.values:
+            message = {
+                "details" : str(new_status) + " is not a valid status. " \
+                    "Valid values are: " + ", ".join(Task.Status.values) + "."
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        uuids = request.data.get("tasks")
+        if not isinstance(uuids, list) or not uuids:
+            message = {
+                "details" : "Expected a list of task UUIDs in the tasks field.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(uuids) > self.bulk_limit:
+            message = {
+                "details" : "Can't move more than " + \
+                    str(self.bulk_limit) + " tasks at once.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            uuids = [uuid.UUID(str(value)) for value in uuids]
+        except ValueError:
+            message = {
+                "details" : "Expected a list of task UUIDs in the tasks field.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        label = Task.Status(new_status).label
+
+        with transaction.atomic():
+            tasks = list(
+                Task.objects.filter(uuid__in=uuids)
+                    .exclude(status=new_status)
+                    .select_for_update()
+                    .only("uuid", "summary")
+                    .order_by()
+            )
+
+            # update() skips auto_now, so the edit time is set here
+            Task.objects.filter(uuid__in=[task.uuid for task in tasks]) \
+                .update(status=new_status, datetime_edited=timezone.now())
+
+            Activity.objects.bulk_create([
+                Activity(
+                    user=request.user,
+                    type=Activity.Type.TASK_STATUS_CHANGE,
+                    task_id=task.uuid,
+                )
+                for task in tasks
+            ])
+            notify_watchers([
+                (
+                    task.uuid,
+                    request.user.id,
+                    request.user.username + \
+                        " has changed the status of your task: " + \
+                        str(task.summary) + " to " + str(label),
+                    request.user.username + \
+                        " has changed the status of a task you're " + \
+                        "watching: " + str(task.summary) + " to " + str(label),
+                )
+                for task in tasks
+            ])
+
+        if tasks:
+            invalidate("tasks", "activity")
+
+        return Response({
+            "status" : new_status,
+            "updated" : [str(task.uuid) for task in tasks],
+        })
+
+    @action(detail=False, url_path="review-queue")
+    def review_queue(self, request):
+        """Returns a page of the tasks waiting for review, oldest first,
+        so that the longest waiting are triaged first.
+
+        Pages walk the task_status_created_idx index on (status,
+        datetime_created, uuid)."""
+
+        queryset = Task.objects.filter(status=Task.Status.REVIEWING)
+        paginator = KeysetPagination(ordering=("datetime_created", "uuid"))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = TaskOverviewSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 class ProjectViewSet(viewsets.ViewSet):
     """ViewSet for the Projects model."""
 
     permission_classes=(AllowAny,)
     lookup_field = "name"
 
+    @method_decorator(cache_response("projects"))
     def list(self, request):
         """Returns the list of projects."""
 
@@ -114,6 +528,8 @@ class ProjectViewSet(viewsets.ViewSet):
         
         return Response(project_list)
     
+    @method_decorator(conditional(project_validators))
+    @method_decorator(coalesce_response("projects"))
     def retrieve(self, request, name=None):
         """Returns a single project."""
 
@@ -129,14 +545,23 @@ class CommentViewSet(viewsets.ViewSet):
     permission_classes=(IsAuthenticatedOrReadOnly,)
 
     def list(self, request):
-        queryset = Comment.objects.all()
-        serializer = CommentSerializer(queryset, many=True)
-        return Response(serializer.data)
+        """Returns a page of comments, oldest to newest. With
+        `stream=true`, every comment is streamed as a single JSON array
+        instead, unpaginated."""
+
+        queryset = comments_with_posters()
+        if wants_stream(request):
+            return stream_json(queryset.order_by("date_created", "id"), CommentSerializer)
+
+        paginator = KeysetPagination(ordering=("date_created", "id"))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = CommentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     def retrieve(self, request, pk=None):
         """Returns a single comment."""
 
-        queryset = Comment.objects.all()
+        queryset = comments_with_posters()
         comment = get_object_or_404(queryset, pk=pk)
         serializer = CommentSerializer(comment)
         return Response(serializer.data)
@@ -161,31 +586,156 @@ class CommentViewSet(viewsets.ViewSet):
 
 @api_view(["GET"])
 def view_notifications(request, username):
-    """Returns the user's current notifications"""
+    """Returns a page of the user's notifications, newest first, read or
+    not. With `stream=true`, every notification is streamed instead,
+    unpaginated."""
 
     user = get_object_or_404(TaskboardUser.objects.all(), username=username)
-    queryset = Notification.objects.filter(receiver=user)
-    serializer = NotificationDetailsSerializer(queryset, many=True)
-    return Response(serializer.data)
+    ordering = ("-datetime_created", "-id")
+    queryset = Notification.objects.filter(receiver=user).select_related("actor")
+    if wants_stream(request):
+        return stream_json(queryset.order_by(*ordering), NotificationDetailsSerializer)
+
+    paginator = KeysetPagination(ordering=ordering)
+    page = paginator.paginate_queryset(queryset, request)
+    serializer = NotificationDetailsSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
 
 @api_view(["GET"])
+def view_unread_count(request, username):
+    """Returns the number of notifications the user hasn't read yet.
+
+    The count only reads the notification_unread_idx partial index, so
+    it doesn't get slower as read notifications pile up."""
+
+    user = get_object_or_404(TaskboardUser.objects.all(), username=username)
+    count = Notification.objects.filter(receiver=user, is_read=False).count()
+    return Response({"unread_count": count})
+
+mark_read_limit = 500
+"""Most notification ids that can be marked as read with one request."""
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request, username):
+    """Marks the user's notifications as read, in a single query. Only
+    the user can mark their own notifications.
+
+    Takes an optional `ids` list of at most `mark_read_limit`
+    notifications to mark. Without it, every notification is marked."""
+
+    if request.user.username != username:
+        message = {
+            "details" : "Cannot mark another user's notifications as read.",
+        }
+        return Response(message, status=status.HTTP_403_FORBIDDEN)
+
+    if not isinstance(request.data, dict):
+        message = {
+            "details" : "Expected an object, with an optional ids field.",
+        }
+        return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = Notification.objects.filter(receiver=request.user, is_read=False)
+
+    ids = request.data.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list) or \
+                not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            message = {
+                "details" : "Expected a list of notification ids in the " \
+                    "ids field.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(ids) > mark_read_limit:
+            message = {
+                "details" : "Can't mark more than " + \
+                    str(mark_read_limit) + " notifications at once.",
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = queryset.filter(id__in=ids)
+
+    updated = queryset.update(is_read=True)
+    return Response({"updated": updated})
+
+@api_view(["GET"])
+@coalesce_response("activity")
 def view_user_activity(request, username):
-    """Returns a list of a user's activity on the website."""
+    """Returns a list of a user's activity on the website. With
+    `stream=true`, it's streamed rather than serialized all at once."""
 
     user = get_object_or_404(TaskboardUser.objects.all(), username=username)
-    queryset = Activity.objects.filter(user=user).order_by("-datetime_created")
+    queryset = Activity.objects.filter(user=user).select_related("user") \
+        .order_by("-datetime_created")
+    if wants_stream(request):
+        return stream_json(queryset, ActivityDetailsSerializer)
+
     serializer = ActivityDetailsSerializer(queryset, many=True)
     return Response(serializer.data)
 
 @api_view(["GET"])
+@cache_response("task-choices")
 def get_task_types(request):
     """Returns a list of the different types a task can have."""
     return Response(Task.Type.choices)
 
 @api_view(["GET"])
+@cache_response("task-choices")
 def get_task_status_types(request):
     """Returns a list of the different status values a task can
     have."""
     return Response(Task.Status.choices)
 
-        
\ No newline at end of file
+        
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def export_tasks(request):
+    """Streams every task, with its comments, project and author, for
+    backups and analytics. Staff only.
+
+    The `output` parameter picks between `ndjson` (the default, a task
+    per line) and `csv` (a row per comment). `edited_after` and
+    `edited_before` take ISO 8601 datetimes, and limit the export to
+    tasks last edited in that range; the first is inclusive and the
+    second isn't. Datetimes without a time zone are taken as UTC, like
+    import_taskboard does."""
+
+    output = request.GET.get("output", "ndjson")
+    if output not in export.FORMATS:
+        message = {
+            "details" : "Cannot export as " + str(output) + ". Tasks can " + \
+                "be exported as ndjson or csv."
+        }
+        return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+    bounds = {}
+    for name in ("edited_after", "edited_before"):
+        value = request.GET.get(name, "")
+        if value == "":
+            continue
+
+        try:
+            bounds[name] = parse_datetime(value)
+        except ValueError:
+            bounds[name] = None
+
+        if bounds[name] is None:
+            message = {
+                "details" : str(value) + " is not a valid datetime for " + \
+                    name + ". Use ISO 8601, e.g. 2024-03-01T12:00:00Z."
+            }
+            return Response(message, status=status.HTTP_400_BAD_REQUEST)
+
+        if timezone.is_naive(bounds[name]):
+            bounds[name] = timezone.make_aware(bounds[name], datetime.timezone.utc)
+
+    generator, content_type = export.FORMATS[output]
+    response = StreamingHttpResponse(
+        generator(export.iter_task_chunks(**bounds)),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = 'attachment; filename="taskboard.' + output + '"'
+    return response
@@ -3,6 +3,7 @@ from django.shortcuts import get_object_or_404
 from .models import TaskboardUser
 from rest_framework.exceptions import ValidationError
 import re
+from taskboard.timing import TimedSerializerMixin
 
 class TaskboardUserCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating a comment."""
@@ -30,7 +31,7 @@ class TaskboardUserCreateSerializer(serializers.ModelSerializer):
         
         return user
 
-class TaskboardUserProfileSerializer(serializers.ModelSerializer):
+class TaskboardUserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for viewing a user's profile."""
 
     class Meta:
@@ -15,6 +15,7 @@ from .serializers import (
     TaskboardUserModificationSerializer,
 )
 from .models import TaskboardUser
+from taskboard.conditional import conditional, make_etag
 
 class LoginStatusAPI(APIView):
     authentication_classes = [JWTStatelessUserAuthentication]
@@ -108,8 +109,20 @@ class ProfileViewSet(viewsets.ViewSet):
 
         return Response(serializer.data)
 
-    
+
+def profile_validators(request, username):
+    """Returns the ETag of a user's profile."""
+
+    values = TaskboardUser.objects.filter(username=username) \
+        .values_list("id", "username", "name", "title", "about_me").first()
+
+    if values is None:
+        return None
+
+    return make_etag(*values), None
+
 @api_view(["GET"])
+@conditional(profile_validators)
 def view_profile(request, username):
     user = get_object_or_404(TaskboardUser.objects.all(), username=username)
     serializer = TaskboardUserProfileSerializer(user)